@@ -1,13 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
 from sqlalchemy.orm import Session
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import os
+import xxhash
+from typing import Optional
 from dotenv import load_dotenv
 
 from ..database.database import get_db, create_tables
 from ..services.data_service import NonprofitService
 from ..services.rag_service import RAGService
+from ..services.groq_service import MAX_CONCURRENT_REQUESTS
 from ..models.nonprofit import ChatMessage, ChatResponse
 
 load_dotenv()
@@ -21,12 +26,15 @@ rag_service = RAGService()
 app = FastAPI(
     title="Houston Nonprofit RAG API",
     description="API for Houston nonprofit data analysis with RAG capabilities",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize RAG service on startup"""
+    # Blocking Groq calls run on the default executor; give it a worker per allowed request
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS))
     await rag_service.initialize_with_data()
 
 app.add_middleware(
@@ -37,6 +45,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+def cacheable_response(request: Request, payload: dict, max_age: int = 60) -> Response:
+    """JSON response with an ETag; answers 304 Not Modified when the client already has it"""
+    response = ORJSONResponse(payload)
+    etag = f'"{xxhash.xxh3_64_hexdigest(response.body)}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
+    return response
+
 @app.get("/")
 async def root():
     return {"message": "Houston Nonprofit RAG API", "status": "running"}
@@ -46,72 +77,97 @@ async def health_check():
     return {"status": "healthy"}
 
 @app.get("/api/nonprofits")
-async def get_nonprofits(
+def get_nonprofits(
     limit: int = 100,
     offset: int = 0,
     ntee_code: str = None,
     search: str = None,
+    after_id: int = None,
     db: Session = Depends(get_db)
 ):
-    """Get nonprofit organizations with optional filtering"""
+    """Get nonprofit organizations with optional filtering
+    
+    Pass `next_cursor` from the previous page as `after_id` to page with a keyset
+    cursor; `offset` remains available for jumping to an arbitrary page.
+    
+    Declared sync so FastAPI runs the blocking database query in its threadpool
+    instead of on the event loop.
+    """
     service = NonprofitService(db)
     nonprofits = service.get_nonprofits(
         skip=offset,
         limit=limit,
         ntee_code=ntee_code,
-        search=search
+        search=search,
+        after_id=after_id
     )
     
-    # Convert to dict format for JSON response
-    result = []
-    for np in nonprofits:
-        result.append({
-            "id": np.id,
-            "ein": np.ein,
-            "name": np.name,
-            "ntee_code": np.ntee_code,
-            "ntee_description": np.ntee_description,
-            "city": np.city,
-            "state": np.state,
-            "total_revenue": np.total_revenue,
-            "total_expenses": np.total_expenses,
-            "net_assets": np.net_assets,
-            "mission_description": np.mission_description,
-            "website": np.website
-        })
+    # Rows only carry the listed columns, so they map straight to JSON objects
+    result = [dict(row._mapping) for row in nonprofits]
     
-    return {
+    total = service.get_nonprofit_count(ntee_code=ntee_code, search=search)
+    
+    # Returning the response directly skips FastAPI's jsonable_encoder pass
+    return ORJSONResponse({
         "nonprofits": result,
-        "total": len(result),
+        "total": total,
         "offset": offset,
-        "limit": limit
-    }
+        "limit": limit,
+        "next_cursor": result[-1]["id"] if result and len(result) == limit else None
+    })
 
 @app.get("/api/stats/dashboard")
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(request: Request, db: Session = Depends(get_db)):
     """Get dashboard statistics"""
     service = NonprofitService(db)
+    return cacheable_response(request, service.get_dashboard_stats())
+
+# Boilerplate messages answered without retrieval or the LLM
+GREETING_REPLY = (
+    "Hi! I can answer questions about Houston nonprofits - their missions, programs, "
+    "and finances. Try asking \"What are the largest nonprofits in Houston?\""
+)
+QUICK_REPLIES = {
+    "hi": GREETING_REPLY,
+    "hello": GREETING_REPLY,
+    "hey": GREETING_REPLY,
+    "thanks": "You're welcome! Let me know if you have more questions about Houston nonprofits.",
+    "thank you": "You're welcome! Let me know if you have more questions about Houston nonprofits.",
+}
+CATEGORY_QUERIES = {"categories", "list categories", "show categories"}
+HELP_QUERIES = {"help", "?"}
+
+async def quick_reply(message: str, db: Session) -> Optional[str]:
+    """Canned reply for trivial messages, or None if the message needs the RAG pipeline"""
+    normalized = message.strip().lower().rstrip("!.?") or message.strip()
     
-    financial_summary = service.get_financial_summary()
-    ntee_distribution = service.get_ntee_distribution()
+    if normalized in QUICK_REPLIES:
+        return QUICK_REPLIES[normalized]
     
-    # Top 5 categories by count
-    top_categories = sorted(ntee_distribution, key=lambda x: x['count'], reverse=True)[:5]
+    if normalized in HELP_QUERIES:
+        suggestions = await rag_service.suggest_questions()
+        return "Here are some questions you can ask:\n" + "\n".join(f"- {q}" for q in suggestions[:5])
     
-    return {
-        "total_nonprofits": financial_summary['total_organizations'],
-        "total_revenue": financial_summary['total_revenue'],
-        "total_expenses": financial_summary['total_expenses'],
-        "total_assets": financial_summary['total_assets'],
-        "average_revenue": financial_summary['average_revenue'],
-        "top_categories": top_categories,
-        "ntee_distribution": ntee_distribution
-    }
+    if normalized in CATEGORY_QUERIES:
+        top_categories = NonprofitService(db).get_ntee_distribution(top_n=5)
+        if top_categories:
+            lines = [f"- {c['description'] or c['code']} ({c['count']} organizations)" for c in top_categories]
+            return "The largest nonprofit categories are:\n" + "\n".join(lines)
+    
+    return None
 
 @app.post("/api/chat")
 async def chat_with_rag(message: ChatMessage, db: Session = Depends(get_db)):
     """Chat endpoint for RAG-powered Q&A about nonprofits"""
     try:
+        reply = await quick_reply(message.message, db)
+        if reply is not None:
+            return ChatResponse(
+                response=reply,
+                sources=[],
+                conversation_id=message.conversation_id or "default"
+            )
+        
         # Use RAG service for intelligent responses
         rag_response = await rag_service.chat(
             query=message.message,
@@ -132,16 +188,16 @@ async def chat_with_rag(message: ChatMessage, db: Session = Depends(get_db)):
         )
 
 @app.get("/api/chat/suggestions")
-async def get_chat_suggestions():
+async def get_chat_suggestions(request: Request):
     """Get suggested questions for users"""
     suggestions = await rag_service.suggest_questions()
-    return {"suggestions": suggestions}
+    return cacheable_response(request, {"suggestions": suggestions})
 
 @app.get("/api/search/semantic")
 async def semantic_search(query: str, limit: int = 10):
     """Perform semantic search across nonprofits"""
     try:
-        results = rag_service.embedding_service.semantic_search(query, k=limit)
+        results = rag_service.semantic_search(query, k=limit)
         return {"results": results, "query": query, "count": len(results)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
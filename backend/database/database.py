@@ -9,14 +9,29 @@ load_dotenv()
 # Database URL - can be SQLite for development or PostgreSQL for production
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./nonprofits.db")
 
+# Connection pool settings for server databases (ignored for SQLite)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = 30
+POOL_RECYCLE = 1800
+
+if "sqlite" in DATABASE_URL:
+    engine_options = {"connect_args": {"check_same_thread": False}}
+else:
+    # Sized QueuePool for concurrent API requests; pre-ping replaces stale connections
+    engine_options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_pre_ping": True,
+        "pool_recycle": POOL_RECYCLE,
+    }
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_engine(DATABASE_URL, **engine_options)
 
-# Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Create SessionLocal class; keep loaded attributes after commit to avoid re-fetching them
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create Base class
 Base = declarative_base()
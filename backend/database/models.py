@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, Index, DDL, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -49,8 +49,22 @@ class Nonprofit(Base):
         Index('idx_location', 'city', 'state'),
         Index('idx_revenue', 'total_revenue'),
         Index('idx_ntee_revenue', 'ntee_code', 'total_revenue'),
+        Index('idx_ntee_cov', 'ntee_code', 'ntee_description'),
     )
 
+# Full-text search document for PostgreSQL; queries must use this exact expression to hit the GIN index
+SEARCH_TSVECTOR_SQL = (
+    "to_tsvector('english', coalesce(name, '') || ' ' || "
+    "coalesce(mission_description, '') || ' ' || coalesce(program_description, ''))"
+)
+
+event.listen(
+    Nonprofit.__table__,
+    'after_create',
+    DDL(f"CREATE INDEX IF NOT EXISTS idx_search_fts ON nonprofits USING gin ({SEARCH_TSVECTOR_SQL})")
+    .execute_if(dialect='postgresql')
+)
+
 class NonprofitDocument(Base):
     """Table for storing document chunks for RAG system"""
     __tablename__ = "nonprofit_documents"
@@ -2,9 +2,9 @@
 Initialize embeddings for Houston nonprofit data
 This script loads all nonprofit data and creates vector embeddings
 """
-import json
 import sys
 import os
+import ijson
 from pathlib import Path
 
 # Add backend to path so we can import services
@@ -12,51 +12,67 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from services.embedding_service import EmbeddingService
 
+def iter_nonprofits(path: Path):
+    """Stream nonprofit records from a JSON array file without parsing it all at once"""
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+DATA_DIR = Path("../data/processed")
+SAMPLE_FILE = DATA_DIR / "houston_nonprofits_sample.json"
+SUMMARY_FILE = DATA_DIR / "houston_nonprofits_summary.json"
+
 def load_nonprofit_data():
     """Load all nonprofit data from JSON files"""
     nonprofits = []
-    data_dir = Path("../data/processed")
     
     # Load sample data
-    sample_file = data_dir / "houston_nonprofits_sample.json"
-    if sample_file.exists():
-        print(f"Loading sample data from {sample_file}")
-        with open(sample_file, 'r') as f:
-            sample_data = json.load(f)
-            nonprofits.extend(sample_data)
+    if SAMPLE_FILE.exists():
+        print(f"Loading sample data from {SAMPLE_FILE}")
+        nonprofits.extend(iter_nonprofits(SAMPLE_FILE))
     
     # Load summary data if available
-    summary_file = data_dir / "houston_nonprofits_summary.json"
-    if summary_file.exists():
-        print(f"Loading summary data from {summary_file}")
-        with open(summary_file, 'r') as f:
-            summary_data = json.load(f)
-            if isinstance(summary_data, list):
-                nonprofits.extend(summary_data)
+    if SUMMARY_FILE.exists():
+        print(f"Loading summary data from {SUMMARY_FILE}")
+        # Yields nothing unless the file holds a list of organizations
+        nonprofits.extend(iter_nonprofits(SUMMARY_FILE))
     
     print(f"Loaded {len(nonprofits)} total nonprofit organizations")
     return nonprofits
 
+def index_is_fresh(embedding_service: EmbeddingService) -> bool:
+    """Check whether the saved index is newer than every data file"""
+    index_files = [embedding_service.index_path, embedding_service.documents_path, embedding_service.metadata_path]
+    data_files = [p for p in (SAMPLE_FILE, SUMMARY_FILE) if p.exists()]
+    
+    if embedding_service.index is None or not data_files or not all(p.exists() for p in index_files):
+        return False
+    
+    return min(p.stat().st_mtime for p in index_files) >= max(p.stat().st_mtime for p in data_files)
+
 def main():
     """Main function to initialize embeddings"""
     print("🚀 Initializing Houston Nonprofit RAG System")
     print("=" * 50)
     
     try:
-        # Load nonprofit data
-        nonprofits = load_nonprofit_data()
-        
-        if not nonprofits:
-            print("❌ No nonprofit data found. Please ensure data files exist in ../data/processed/")
-            return
-        
-        # Initialize embedding service
+        # Initialize embedding service (loads the saved index if there is one)
         print("\n📊 Initializing embedding service...")
         embedding_service = EmbeddingService()
         
-        # Create embeddings
-        print("🔄 Creating vector embeddings...")
-        embedding_service.create_embeddings_from_nonprofits(nonprofits)
+        if index_is_fresh(embedding_service) and "--force" not in sys.argv:
+            # Nothing changed since the last run; skip parsing the data files entirely
+            print("✅ Saved index is newer than the data files, skipping rebuild (use --force to rebuild)")
+        else:
+            # Load nonprofit data
+            nonprofits = load_nonprofit_data()
+            
+            if not nonprofits:
+                print("❌ No nonprofit data found. Please ensure data files exist in ../data/processed/")
+                return
+            
+            # Create embeddings
+            print("🔄 Creating vector embeddings...")
+            embedding_service.create_embeddings_from_nonprofits(nonprofits)
         
         # Test the system
         print("\n🧪 Testing search functionality...")
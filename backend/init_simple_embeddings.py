@@ -2,9 +2,9 @@
 Initialize TF-IDF embeddings for Houston nonprofit data
 This script loads all nonprofit data and creates vector embeddings using scikit-learn
 """
-import json
 import sys
 import os
+import ijson
 from pathlib import Path
 
 # Add backend to path so we can import services
@@ -12,33 +12,37 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from services.simple_embedding_service import SimpleEmbeddingService
 
+def iter_nonprofits(path: Path):
+    """Stream nonprofit records from a JSON array file without parsing it all at once"""
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
 def load_nonprofit_data():
-    """Load all nonprofit data from JSON files"""
-    nonprofits = []
+    """Load all nonprofit data from JSON files, keeping the first record seen per EIN"""
+    by_ein = {}
+    without_ein = []
     data_dir = Path("../data/processed")
     
+    def merge(orgs):
+        for org in orgs:
+            if org.get('ein'):
+                by_ein.setdefault(org['ein'], org)
+            else:
+                without_ein.append(org)
+    
     # Load sample data
     sample_file = data_dir / "houston_nonprofits_sample.json"
     if sample_file.exists():
         print(f"Loading sample data from {sample_file}")
-        with open(sample_file, 'r') as f:
-            sample_data = json.load(f)
-            nonprofits.extend(sample_data)
+        merge(iter_nonprofits(sample_file))
     
-    # Load summary data if available
+    # Load summary data if available (the file only yields records if it holds a list)
     summary_file = data_dir / "houston_nonprofits_summary.json"
     if summary_file.exists():
         print(f"Loading summary data from {summary_file}")
-        with open(summary_file, 'r') as f:
-            summary_data = json.load(f)
-            if isinstance(summary_data, list):
-                # Filter out duplicates by EIN
-                existing_eins = {org.get('ein') for org in nonprofits if org.get('ein')}
-                for org in summary_data:
-                    if org.get('ein') and org['ein'] not in existing_eins:
-                        nonprofits.append(org)
-                        existing_eins.add(org['ein'])
+        merge(org for org in iter_nonprofits(summary_file) if org.get('ein'))
     
+    nonprofits = list(by_ein.values()) + without_ein
     print(f"Loaded {len(nonprofits)} total nonprofit organizations")
     return nonprofits
 
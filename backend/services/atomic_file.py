@@ -0,0 +1,28 @@
+"""
+Atomic file writes for Houston Nonprofit RAG System
+Index files are written to a unique temporary file and renamed into place
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+@contextmanager
+def atomic_write(path: Path, mode: str = 'wb') -> Iterator[IO]:
+    """Open a temporary file next to path, renamed over path when the block succeeds
+
+    Each writer gets its own temporary file, so server workers rebuilding the index
+    at the same time don't clobber each other's output, and readers (including
+    memmaps of the previous file) never see a partially written one.
+    """
+    path = Path(path)
+    tmp = tempfile.NamedTemporaryFile(mode, dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with tmp as f:
+            yield f
+        os.chmod(tmp.name, 0o644)  # Temporary files are created owner-only
+        os.replace(tmp.name, path)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
@@ -1,14 +1,76 @@
-import json
-import hashlib
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
+import threading
+import ijson
+import orjson
+import xxhash
+from pathlib import Path
+from typing import Iterator, List, Optional
+from cachetools import TTLCache
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy import or_, and_, func, text, select, literal_column, Row
 
-from ..database.models import Nonprofit, NonprofitDocument
+from ..database.models import Nonprofit, NonprofitDocument, SEARCH_TSVECTOR_SQL
 from ..models.nonprofit import NonprofitCreate, NonprofitSearch
 
+def _content_hash(content: str) -> str:
+    """Hash used to deduplicate document chunks (a dedup key, not a security token)"""
+    return xxhash.xxh3_128_hexdigest(content.encode())
+
+def _document_chunk(nonprofit_id: int, content: str, document_type: str) -> dict:
+    """Build a NonprofitDocument row mapping (without content_hash) for bulk inserts"""
+    return {
+        'nonprofit_id': nonprofit_id,
+        'document_type': document_type,
+        'content': content
+    }
+
+def _read_json_records(file_path: str) -> Iterator[dict]:
+    """Records streamed from a JSON array file, or line by line from a JSON Lines (.jsonl) file"""
+    with open(file_path, 'rb') as f:
+        if Path(file_path).suffix == '.jsonl':
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+        else:
+            # use_float keeps numbers as float rather than Decimal, as json.load would
+            yield from ijson.items(f, 'item', use_float=True)
+
+def _hash_document_chunks(chunks: List[dict]) -> List[dict]:
+    """Fill in content_hash for a batch of chunk rows in one pass, hashing each distinct text once"""
+    hashes = {content: _content_hash(content) for content in {chunk['content'] for chunk in chunks}}
+    for chunk in chunks:
+        chunk['content_hash'] = hashes[chunk['content']]
+    return chunks
+
+# Columns returned by list endpoints: mission_description is kept for the list cards, while the
+# program_description and activities_description TEXT columns are left out
+NONPROFIT_LIST_COLUMNS = (
+    Nonprofit.id,
+    Nonprofit.ein,
+    Nonprofit.name,
+    Nonprofit.ntee_code,
+    Nonprofit.ntee_description,
+    Nonprofit.city,
+    Nonprofit.state,
+    Nonprofit.total_revenue,
+    Nonprofit.total_expenses,
+    Nonprofit.net_assets,
+    Nonprofit.mission_description,
+    Nonprofit.website
+)
+
+# Short-lived caches shared by the per-request service instances
+STATS_CACHE_TTL = 60
+_count_cache = TTLCache(maxsize=256, ttl=STATS_CACHE_TTL)
+_summary_cache = TTLCache(maxsize=16, ttl=STATS_CACHE_TTL)
+_stats_cache_lock = threading.Lock()
+
 class NonprofitService:
-    """Service for managing nonprofit data"""
+    """Service for managing nonprofit data
+    
+    List queries select only the columns they return (NONPROFIT_LIST_COLUMNS), and
+    ORM-returning queries use raiseload('*') so any relationship added later has to be
+    loaded explicitly (e.g. selectinload) rather than lazily per row.
+    """
     
     def __init__(self, db: Session):
         self.db = db
@@ -23,30 +85,32 @@ class NonprofitService:
     
     def get_nonprofit_by_ein(self, ein: str) -> Optional[Nonprofit]:
         """Get nonprofit by EIN"""
-        return self.db.query(Nonprofit).filter(Nonprofit.ein == ein).first()
+        return self.db.query(Nonprofit).options(raiseload('*')).filter(Nonprofit.ein == ein).first()
     
-    def get_nonprofits(
-        self, 
-        skip: int = 0, 
-        limit: int = 100,
+    def _apply_filters(
+        self,
+        query,
         ntee_code: Optional[str] = None,
         search: Optional[str] = None,
         min_revenue: Optional[float] = None,
         max_revenue: Optional[float] = None
-    ) -> List[Nonprofit]:
-        """Get nonprofits with optional filtering"""
-        query = self.db.query(Nonprofit)
-        
-        # Apply filters
+    ):
+        """Apply the optional listing filters to a query"""
         if ntee_code:
             query = query.filter(Nonprofit.ntee_code == ntee_code)
         
         if search:
-            search_filter = or_(
-                Nonprofit.name.ilike(f"%{search}%"),
-                Nonprofit.mission_description.ilike(f"%{search}%"),
-                Nonprofit.program_description.ilike(f"%{search}%")
-            )
+            if self.db.get_bind().dialect.name == 'postgresql':
+                # Full-text match served by the idx_search_fts GIN index
+                search_filter = text(
+                    f"{SEARCH_TSVECTOR_SQL} @@ plainto_tsquery('english', :search)"
+                ).bindparams(search=search)
+            else:
+                search_filter = or_(
+                    Nonprofit.name.ilike(f"%{search}%"),
+                    Nonprofit.mission_description.ilike(f"%{search}%"),
+                    Nonprofit.program_description.ilike(f"%{search}%")
+                )
             query = query.filter(search_filter)
         
         if min_revenue is not None:
@@ -55,24 +119,88 @@ class NonprofitService:
         if max_revenue is not None:
             query = query.filter(Nonprofit.total_revenue <= max_revenue)
         
-        return query.offset(skip).limit(limit).all()
+        return query
     
-    def get_nonprofit_count(self) -> int:
-        """Get total count of nonprofits"""
-        return self.db.query(Nonprofit).count()
+    def get_nonprofits(
+        self, 
+        skip: int = 0, 
+        limit: int = 100,
+        ntee_code: Optional[str] = None,
+        search: Optional[str] = None,
+        min_revenue: Optional[float] = None,
+        max_revenue: Optional[float] = None,
+        after_id: Optional[int] = None
+    ) -> List[Row]:
+        """Get nonprofits with optional filtering, selecting only NONPROFIT_LIST_COLUMNS
+        
+        Results are ordered by id. Pass the last id of the previous page as after_id
+        for keyset pagination, which seeks on the primary key instead of scanning
+        and discarding `skip` rows.
+        """
+        query = self._apply_filters(
+            self.db.query(*NONPROFIT_LIST_COLUMNS),
+            ntee_code=ntee_code,
+            search=search,
+            min_revenue=min_revenue,
+            max_revenue=max_revenue
+        )
+        
+        if after_id is not None:
+            query = query.filter(Nonprofit.id > after_id)
+        
+        query = query.order_by(Nonprofit.id)
+        if skip:
+            query = query.offset(skip)
+        
+        return query.limit(limit).all()
     
-    def get_ntee_distribution(self) -> dict:
-        """Get distribution of organizations by NTEE code"""
-        from sqlalchemy import func
+    def get_nonprofit_count(
+        self,
+        ntee_code: Optional[str] = None,
+        search: Optional[str] = None,
+        min_revenue: Optional[float] = None,
+        max_revenue: Optional[float] = None
+    ) -> int:
+        """Get count of nonprofits matching the filters, cached briefly per filter combination"""
+        key = (ntee_code, search, min_revenue, max_revenue)
+        with _stats_cache_lock:
+            count = _count_cache.get(key)
         
-        results = self.db.query(
+        if count is None:
+            query = self._apply_filters(
+                self.db.query(func.count(Nonprofit.id)),
+                ntee_code=ntee_code,
+                search=search,
+                min_revenue=min_revenue,
+                max_revenue=max_revenue
+            )
+            count = query.scalar()
+            with _stats_cache_lock:
+                _count_cache[key] = count
+        
+        return count
+    
+    @staticmethod
+    def clear_stats_cache() -> None:
+        """Drop cached counts and summaries after the data changes"""
+        with _stats_cache_lock:
+            _count_cache.clear()
+            _summary_cache.clear()
+    
+    def get_ntee_distribution(self, top_n: Optional[int] = None) -> dict:
+        """Get distribution of organizations by NTEE code, largest first (optionally only the top_n)"""
+        count = func.count(Nonprofit.id)
+        query = self.db.query(
             Nonprofit.ntee_code,
             Nonprofit.ntee_description,
-            func.count(Nonprofit.id).label('count')
+            count.label('count')
         ).group_by(
             Nonprofit.ntee_code, 
             Nonprofit.ntee_description
-        ).all()
+        ).order_by(count.desc())
+        
+        if top_n is not None:
+            query = query.limit(top_n)
         
         return [
             {
@@ -80,13 +208,11 @@ class NonprofitService:
                 'description': r.ntee_description,
                 'count': r.count
             }
-            for r in results
+            for r in query.all()
         ]
     
     def get_financial_summary(self) -> dict:
         """Get financial summary statistics"""
-        from sqlalchemy import func
-        
         result = self.db.query(
             func.sum(Nonprofit.total_revenue).label('total_revenue'),
             func.sum(Nonprofit.total_expenses).label('total_expenses'),
@@ -103,6 +229,105 @@ class NonprofitService:
             'total_organizations': result.total_orgs
         }
     
+    def get_dashboard_stats(self, top_n: int = 5) -> dict:
+        """Get financial totals and NTEE distribution from a single grouped query"""
+        with _stats_cache_lock:
+            stats = _summary_cache.get('dashboard_stats')
+        if stats is not None:
+            return stats
+        
+        count = func.count(Nonprofit.id)
+        results = self.db.query(
+            Nonprofit.ntee_code,
+            Nonprofit.ntee_description,
+            count.label('count'),
+            func.sum(Nonprofit.total_revenue).label('total_revenue'),
+            func.sum(Nonprofit.total_expenses).label('total_expenses'),
+            func.sum(Nonprofit.net_assets).label('total_assets'),
+            func.count(Nonprofit.total_revenue).label('revenue_count')
+        ).group_by(
+            Nonprofit.ntee_code,
+            Nonprofit.ntee_description
+        ).order_by(count.desc()).all()
+        
+        # Table-wide totals are the sums over the (few) NTEE groups
+        total_revenue = float(sum(r.total_revenue or 0 for r in results))
+        revenue_count = sum(r.revenue_count for r in results)
+        ntee_distribution = [
+            {
+                'code': r.ntee_code,
+                'description': r.ntee_description,
+                'count': r.count
+            }
+            for r in results
+        ]
+        
+        stats = {
+            'total_nonprofits': sum(r.count for r in results),
+            'total_revenue': total_revenue,
+            'total_expenses': float(sum(r.total_expenses or 0 for r in results)),
+            'total_assets': float(sum(r.total_assets or 0 for r in results)),
+            'average_revenue': total_revenue / revenue_count if revenue_count else 0.0,
+            'top_categories': ntee_distribution[:top_n],
+            'ntee_distribution': ntee_distribution
+        }
+        with _stats_cache_lock:
+            _summary_cache['dashboard_stats'] = stats
+        
+        return stats
+    
+    def _insert(self, table):
+        """Dialect-specific INSERT that supports ON CONFLICT clauses"""
+        if self.db.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        
+        return insert(table)
+    
+    def _insert_ignoring_duplicates(self):
+        """INSERT ... ON CONFLICT (content_hash) DO NOTHING for document chunks"""
+        return self._insert(NonprofitDocument).on_conflict_do_nothing(index_elements=['content_hash'])
+    
+    def upsert_nonprofits(self, rows: List[dict]) -> List[tuple]:
+        """Insert nonprofits or update the existing rows with the same EIN
+        
+        Rows sharing the same set of columns go out as one executemany INSERT ... ON CONFLICT
+        (ein) DO UPDATE ... RETURNING, so new and existing rows need no separate queries. Only
+        the columns present in a row are overwritten. The caller is responsible for committing.
+        
+        Returns (ein, id, created) tuples. PostgreSQL reports whether each row was inserted
+        through RETURNING (xmax = 0); other databases look up which EINs already exist with
+        one indexed query for the whole batch.
+        """
+        postgres = self.db.get_bind().dialect.name == 'postgresql'
+        if postgres:
+            existing = set()
+        else:
+            eins = [row['ein'] for row in rows]
+            existing = set(self.db.scalars(select(Nonprofit.ein).filter(Nonprofit.ein.in_(eins))))
+        
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+        
+        results = []
+        for keys, group in groups.items():
+            stmt = self._insert(Nonprofit)
+            updates = {'updated_at': func.now()}
+            updates.update({key: stmt.excluded[key] for key in keys if key != 'ein'})
+            stmt = stmt.on_conflict_do_update(index_elements=['ein'], set_=updates)
+            
+            if postgres:
+                # xmax is 0 only for row versions created by an INSERT
+                stmt = stmt.returning(Nonprofit.ein, Nonprofit.id, literal_column('xmax = 0'))
+                results.extend(tuple(row) for row in self.db.execute(stmt, group))
+            else:
+                stmt = stmt.returning(Nonprofit.ein, Nonprofit.id)
+                results.extend((ein, id_, ein not in existing) for ein, id_ in self.db.execute(stmt, group))
+        
+        return results
+    
     def add_document_chunk(
         self, 
         nonprofit_id: int, 
@@ -110,33 +335,34 @@ class NonprofitService:
         document_type: str
     ) -> NonprofitDocument:
         """Add a document chunk for RAG system"""
-        # Create content hash to avoid duplicates
-        content_hash = hashlib.sha256(content.encode()).hexdigest()
+        chunk = _hash_document_chunks([_document_chunk(nonprofit_id, content, document_type)])[0]
         
-        # Check if already exists
-        existing = self.db.query(NonprofitDocument).filter(
-            NonprofitDocument.content_hash == content_hash
+        # The unique index on content_hash rejects duplicates, so no lookup is needed up front
+        doc = self.db.scalars(
+            self._insert_ignoring_duplicates().returning(NonprofitDocument),
+            [chunk]
         ).first()
+        self.db.commit()
         
-        if existing:
-            return existing
-        
-        # Create new document
-        doc = NonprofitDocument(
-            nonprofit_id=nonprofit_id,
-            document_type=document_type,
-            content=content,
-            content_hash=content_hash
-        )
+        if doc is None:
+            # Content already stored
+            doc = self.db.query(NonprofitDocument).filter(
+                NonprofitDocument.content_hash == chunk['content_hash']
+            ).first()
         
-        self.db.add(doc)
-        self.db.commit()
-        self.db.refresh(doc)
         return doc
     
+    def add_document_chunks(self, chunks: List[dict]) -> None:
+        """Add document chunks in one statement, skipping content that is already stored.
+        
+        The caller is responsible for committing.
+        """
+        if chunks:
+            self.db.execute(self._insert_ignoring_duplicates(), chunks)
+    
     def get_documents_for_rag(self, limit: int = 1000) -> List[NonprofitDocument]:
         """Get document chunks for RAG system"""
-        return self.db.query(NonprofitDocument).limit(limit).all()
+        return self.db.query(NonprofitDocument).options(raiseload('*')).limit(limit).all()
 
 class DataIngestionService:
     """Service for ingesting nonprofit data from files"""
@@ -145,96 +371,102 @@ class DataIngestionService:
         self.db = db
         self.nonprofit_service = NonprofitService(db)
     
-    def ingest_from_json(self, file_path: str) -> dict:
-        """Ingest nonprofit data from JSON file"""
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        created_count = 0
-        updated_count = 0
-        error_count = 0
-        
-        for nonprofit_data in data:
-            try:
-                ein = nonprofit_data.get('ein')
-                if not ein:
-                    error_count += 1
-                    continue
-                
-                # Check if nonprofit already exists
-                existing = self.nonprofit_service.get_nonprofit_by_ein(ein)
-                
-                # Filter out fields that don't exist in the model
-                filtered_data = {}
-                for key, value in nonprofit_data.items():
-                    if hasattr(Nonprofit, key) and key != 'id':
-                        filtered_data[key] = value
-                
-                if existing:
-                    # Update existing record
-                    for key, value in filtered_data.items():
-                        setattr(existing, key, value)
-                    self.db.commit()
-                    updated_count += 1
-                else:
-                    # Create new record
-                    self.nonprofit_service.create_nonprofit(filtered_data)
-                    created_count += 1
-                
-                # Add document chunks for RAG
-                if existing or created_count > 0:
-                    nonprofit = existing or self.nonprofit_service.get_nonprofit_by_ein(ein)
-                    self._create_document_chunks(nonprofit, nonprofit_data)
-                    
-            except Exception as e:
-                print(f"Error processing nonprofit {nonprofit_data.get('name', 'Unknown')}: {e}")
-                error_count += 1
+    def ingest_from_json(self, file_path: str, batch_size: int = 500) -> dict:
+        """Ingest nonprofit data from a JSON or JSON Lines file in batches
+        
+        Records are streamed from both formats, so only the current batch is held in memory.
+        """
+        # Only keep fields that exist in the model
+        columns = {column.name for column in Nonprofit.__table__.columns} - {'id'}
+        
+        counts = {'created': 0, 'updated': 0, 'errors': 0}
+        batch = []
+        total_processed = 0
+        
+        for nonprofit_data in _read_json_records(file_path):
+            total_processed += 1
+            if not nonprofit_data.get('ein'):
+                counts['errors'] += 1
+                continue
+            
+            batch.append(nonprofit_data)
+            if len(batch) >= batch_size:
+                self._ingest_batch(batch, columns, counts)
+                batch = []
+        
+        if batch:
+            self._ingest_batch(batch, columns, counts)
         
         return {
-            'created': created_count,
-            'updated': updated_count,
-            'errors': error_count,
-            'total_processed': len(data)
+            'created': counts['created'],
+            'updated': counts['updated'],
+            'errors': counts['errors'],
+            'total_processed': total_processed
         }
     
-    def _create_document_chunks(self, nonprofit: Nonprofit, data: dict):
-        """Create document chunks for RAG system"""
+    def _ingest_batch(self, batch: List[dict], columns: set, counts: dict):
+        """Upsert one batch of nonprofits and their document chunks with a single commit"""
+        rows = {}
+        
+        # Merge repeated EINs into one row
+        for nonprofit_data in batch:
+            filtered_data = {key: value for key, value in nonprofit_data.items() if key in columns}
+            rows.setdefault(nonprofit_data['ein'], {}).update(filtered_data)
+        
+        try:
+            results = self.nonprofit_service.upsert_nonprofits(list(rows.values()))
+            ein_to_id = {ein: id_ for ein, id_, _ in results}
+            
+            # Add document chunks for RAG
+            chunks = []
+            for nonprofit_data in batch:
+                chunks.extend(self._create_document_chunks(ein_to_id[nonprofit_data['ein']], nonprofit_data))
+            self.nonprofit_service.add_document_chunks(_hash_document_chunks(chunks))
+            
+            self.db.commit()
+            self.nonprofit_service.clear_stats_cache()
+            created = sum(bool(created) for _, _, created in results)
+            counts['created'] += created
+            counts['updated'] += len(batch) - created
+            
+        except Exception as e:
+            self.db.rollback()
+            if len(batch) == 1:
+                print(f"Error processing nonprofit {batch[0].get('name', 'Unknown')}: {e}")
+                counts['errors'] += 1
+                return
+            
+            # Retry one record at a time so only the offending records are reported
+            print(f"Error processing batch of {len(batch)} nonprofits, retrying one at a time: {e}")
+            for nonprofit_data in batch:
+                self._ingest_batch([nonprofit_data], columns, counts)
+    
+    def _create_document_chunks(self, nonprofit_id: int, data: dict) -> List[dict]:
+        """Create document chunk rows for RAG system"""
+        chunks = []
+        
         # Mission description
         if data.get('mission_description'):
-            self.nonprofit_service.add_document_chunk(
-                nonprofit.id,
-                data['mission_description'],
-                'mission'
-            )
+            chunks.append(_document_chunk(nonprofit_id, data['mission_description'], 'mission'))
         
         # Program description
         if data.get('program_description'):
-            self.nonprofit_service.add_document_chunk(
-                nonprofit.id,
-                data['program_description'],
-                'programs'
-            )
+            chunks.append(_document_chunk(nonprofit_id, data['program_description'], 'programs'))
         
         # Activities description
         if data.get('activities_description'):
-            self.nonprofit_service.add_document_chunk(
-                nonprofit.id,
-                data['activities_description'],
-                'activities'
-            )
+            chunks.append(_document_chunk(nonprofit_id, data['activities_description'], 'activities'))
         
         # Combined summary for better context
         summary_parts = []
-        summary_parts.append(f"Organization: {nonprofit.name}")
-        summary_parts.append(f"NTEE Code: {nonprofit.ntee_code} - {nonprofit.ntee_description}")
+        summary_parts.append(f"Organization: {data.get('name')}")
+        summary_parts.append(f"NTEE Code: {data.get('ntee_code')} - {data.get('ntee_description')}")
         if data.get('mission_description'):
             summary_parts.append(f"Mission: {data['mission_description']}")
-        if nonprofit.total_revenue:
-            summary_parts.append(f"Annual Revenue: ${nonprofit.total_revenue:,.2f}")
+        if data.get('total_revenue'):
+            summary_parts.append(f"Annual Revenue: ${data['total_revenue']:,.2f}")
         
         summary = ". ".join(summary_parts)
-        self.nonprofit_service.add_document_chunk(
-            nonprofit.id,
-            summary,
-            'summary'
-        )
\ No newline at end of file
+        chunks.append(_document_chunk(nonprofit_id, summary, 'summary'))
+        
+        return chunks
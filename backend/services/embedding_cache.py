@@ -0,0 +1,84 @@
+"""
+Persistent embedding cache for Houston Nonprofit RAG System
+Stores document vectors on disk keyed by a hash of the model name, dtype and text
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List
+import numpy as np
+import xxhash
+
+class EmbeddingCache:
+    """SQLite-backed map of content hash -> embedding vector (stored as float16 or int8)
+
+    int8 storage assumes L2-normalized vectors (components in [-1, 1]) and scales
+    them by 127.
+    """
+
+    # Stay below SQLite's default limit on bound parameters per statement
+    _MAX_PARAMS = 500
+    _INT8_SCALE = 127.0
+
+    def __init__(self, path: Path, model_name: str, dtype=np.float16):
+        """
+        Initialize embedding cache
+
+        Args:
+            path: SQLite database file
+            model_name: Model producing the vectors; part of every key
+            dtype: On-disk dtype of the stored vectors (np.float16 or np.int8)
+        """
+        self.path = Path(path)
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS emb_cache (hash TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+
+    def key(self, text: str) -> str:
+        """Cache key for a document text (vectors stored in another dtype never match)"""
+        return xxhash.xxh3_128_hexdigest(f"{self.model_name}\0{self.dtype.name}\0{text}".encode())
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors (as float32) for the keys that are present"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), self._MAX_PARAMS):
+                batch = keys[start:start + self._MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vec FROM emb_cache WHERE hash IN ({placeholders})", batch
+                )
+                for key, blob in rows:
+                    found[key] = self._decode(blob)
+
+        return found
+
+    def put_many(self, keys: List[str], vectors: np.ndarray) -> None:
+        """Store vectors for the given keys, replacing existing entries"""
+        rows = [(key, self._encode(vector)) for key, vector in zip(keys, vectors)]
+
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO emb_cache (hash, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def _encode(self, vector: np.ndarray) -> bytes:
+        if self.dtype == np.int8:
+            vector = np.clip(np.rint(np.asarray(vector) * self._INT8_SCALE), -127, 127)
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def _decode(self, blob: bytes) -> np.ndarray:
+        vector = np.frombuffer(blob, dtype=self.dtype).astype(np.float32)
+        if self.dtype == np.int8:
+            # Rescale to unit length directly rather than by 1/127, undoing rounding drift
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return vector
+
+    def close(self) -> None:
+        self._conn.close()
@@ -5,41 +5,148 @@ Uses sentence-transformers and FAISS for semantic search
 import os
 import json
 import pickle
+import platform
 import numpy as np
+from functools import lru_cache
 from typing import List, Dict, Any, Tuple, Optional
 from sentence_transformers import SentenceTransformer
 import faiss
+import torch
+import xxhash
+import zstandard as zstd
 from pathlib import Path
+from .embedding_cache import EmbeddingCache
+from .atomic_file import atomic_write
+
+# Keep FAISS/encoder thread pools small so they don't oversubscribe cores shared with the web server
+FAISS_NUM_THREADS = int(os.getenv("FAISS_NUM_THREADS", "4"))
+ENCODER_NUM_THREADS = int(os.getenv("ENCODER_NUM_THREADS", "2"))
+
+def _default_onnx_file() -> str:
+    """ONNX export in the model repo suited to this CPU: an int8 build for its instruction set, else float32"""
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        flags = set()  # Not Linux: no cheap way to check, so stay on the portable export
+    
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx2" in flags:
+        return "onnx/model_quint8_avx2.onnx"
+    return "onnx/model.onnx"
+
+# ONNX_FILE_NAME overrides the automatic choice, e.g. "onnx/model.onnx"
+ONNX_FILE_NAME = os.getenv("ONNX_FILE_NAME") or _default_onnx_file()
+
+# (label, field) pairs making up a document's searchable text, in order
+DOCUMENT_FIELDS = (
+    ("Organization", "name"),
+    ("Mission", "mission_description"),
+    ("Programs", "program_description"),
+    ("Activities", "activities_description"),
+    ("Category", "ntee_description"),
+)
 
 class EmbeddingService:
     """Service for creating and searching vector embeddings"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    # Prebuilt ONNX export shipped in the all-MiniLM-L6-v2 model repo
+    ONNX_FILE_NAME = ONNX_FILE_NAME
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", backend: str = "onnx", static_model: bool = False):
         """
         Initialize embedding service
         
         Args:
             model_name: Sentence transformer model to use
+            backend: "onnx" (ONNX Runtime, int8-quantized) or "torch"
+            static_model: Retrieve candidates with a Model2Vec static distillation of the model
         """
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        faiss.omp_set_num_threads(FAISS_NUM_THREADS)
+        torch.set_num_threads(ENCODER_NUM_THREADS)
+        self.model, self.model_id = self._load_model(model_name, backend)
         self.embedding_dim = 384  # Dimension for all-MiniLM-L6-v2
+        self.encode_batch_size = 64
+        self.nprobe = 8  # IVF clusters visited per query
+        self.ef_construction = 64  # HNSW candidate list size while building the graph
+        self.ef_search = 32  # HNSW candidate list size per query
+        self.rerank_candidates = 20  # Static-model candidates reranked with the full model
+        self.num_neighbors = 10  # Precomputed nearest documents per document
+        
+        # Repeated queries (e.g. the suggested questions) skip the transformer forward pass
+        self._encode_query = lru_cache(maxsize=4096)(self._encode_query_uncached)
         
         # Paths for storing embeddings and index
         self.data_dir = Path("data/embeddings")
         self.data_dir.mkdir(parents=True, exist_ok=True)
         self.index_path = self.data_dir / "faiss_index.bin"
-        self.documents_path = self.data_dir / "documents.pkl"
+        self.documents_path = self.data_dir / "documents.pkl.zst"
         self.metadata_path = self.data_dir / "metadata.json"
+        self.doc_embeddings_path = self.data_dir / "doc_embeddings.f16.npy"
+        self.neighbor_indices_path = self.data_dir / "doc_neighbors.i32.npy"
+        self.neighbor_scores_path = self.data_dir / "doc_neighbor_scores.f32.npy"
+        self.static_model_dir = self.data_dir / "static_model"
+        self.static_embeddings_path = self.data_dir / "static_embeddings.npy"
+        
+        # Bag-of-token-embeddings model: no transformer forward pass at query time
+        self.static_model = self._load_static_model(model_name) if static_model else None
+        
+        # Document vectors from previous runs, so unchanged orgs aren't re-embedded
+        self.embedding_cache = EmbeddingCache(self.data_dir / "embedding_cache.sqlite", self.model_id, dtype=np.int8)
         
         # Initialize FAISS index
         self.index = None
+        self.doc_embeddings = None  # float16 (N, dim), memory-mapped when loaded from disk
+        self.static_embeddings = None  # float32 (N, static dim) from the static model
         self.documents = []
         self.metadata = {}
+        self._name_index = {}  # Lowercased organization name -> index of its first document
+        self._neighbors = None  # (indices, scores) of each document's nearest documents
         
         # Load existing index if available
         self.load_index()
     
+    def _load_model(self, model_name: str, backend: str) -> Tuple[SentenceTransformer, str]:
+        """Load the model, preferring ONNX Runtime; returns the model and an id for cache keys"""
+        if backend == "onnx":
+            try:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = ENCODER_NUM_THREADS
+                
+                model = SentenceTransformer(
+                    model_name,
+                    backend="onnx",
+                    model_kwargs={"file_name": self.ONNX_FILE_NAME, "session_options": session_options}
+                )
+                return model, f"{model_name}/{self.ONNX_FILE_NAME}"
+            except Exception as e:
+                print(f"Could not load ONNX backend, falling back to PyTorch: {e}")
+        
+        return SentenceTransformer(model_name), model_name
+    
+    def _load_static_model(self, model_name: str) -> Optional[SentenceTransformer]:
+        """Load the static distillation of the model, distilling and saving it on first use"""
+        try:
+            if self.static_model_dir.exists():
+                return SentenceTransformer(str(self.static_model_dir), device="cpu")
+            
+            # Needs the model2vec package; only runs once per data directory
+            from sentence_transformers.models import StaticEmbedding
+            print(f"Distilling static embeddings from {model_name}...")
+            model = SentenceTransformer(modules=[StaticEmbedding.from_distillation(model_name, device="cpu")])
+            model.save(str(self.static_model_dir))
+            return model
+            
+        except Exception as e:
+            print(f"Could not load static embedding model: {e}")
+            return None
+    
     def create_embeddings_from_nonprofits(self, nonprofits: List[Dict[str, Any]]) -> None:
         """
         Create embeddings from nonprofit data
@@ -56,27 +163,32 @@ class EmbeddingService:
             doc_text = self._create_document_text(org)
             documents.append(doc_text)
         
-        # Generate embeddings
-        print("Generating embeddings...")
-        embeddings = self.model.encode(documents, show_progress_bar=True)
-        embeddings = np.array(embeddings).astype('float32')
+        # Generate embeddings; keep a float16 copy for reuse and build the index from it
+        self.doc_embeddings = self._encode_documents(documents).astype(np.float16)
         
         # Create FAISS index
         print("Creating FAISS index...")
-        self.index = faiss.IndexFlatIP(self.embedding_dim)  # Inner Product for cosine similarity
-        
-        # Normalize embeddings for cosine similarity
-        faiss.normalize_L2(embeddings)
+        self.index = self._build_index(self.doc_embeddings.astype(np.float32))
         
-        # Add to index
-        self.index.add(embeddings)
+        if self.static_model is not None:
+            self.static_embeddings = self.static_model.encode(
+                documents,
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
         
         # Store documents and metadata
         self.documents = nonprofits
+        self._on_documents_changed()
+        self._neighbors = self._compute_neighbors(self.doc_embeddings)
         self.metadata = {
             "num_documents": len(nonprofits),
             "embedding_dim": self.embedding_dim,
+            "index_type": self._index_description(len(nonprofits)),
             "model_name": self.model_name,
+            "model_id": self.model_id,
+            "content_hash": self._content_hash(documents),
             "created_at": str(np.datetime64('now'))
         }
         
@@ -84,41 +196,108 @@ class EmbeddingService:
         self.save_index()
         print(f"✅ Successfully created and saved embeddings for {len(nonprofits)} nonprofits")
     
-    def _create_document_text(self, org: Dict[str, Any]) -> str:
-        """Create searchable text from nonprofit data"""
-        parts = []
-        
-        # Basic info
-        if org.get('name'):
-            parts.append(f"Organization: {org['name']}")
+    def _index_description(self, num_vectors: int) -> str:
+        """Pick a FAISS index_factory string suited to the corpus size
         
-        # Mission and programs (most important for search)
-        if org.get('mission_description'):
-            parts.append(f"Mission: {org['mission_description']}")
+        Small corpora stay on an exact scan over 8-bit codes. Up to 100k vectors an
+        HNSW graph over the same 8-bit codes searches in ~log N hops; beyond that
+        IVF-PQ bounds memory.
+        """
+        if num_vectors >= 100000:
+            # Probe only nprobe of 256 clusters; 32-byte PQ codes per vector
+            return "IVF256,PQ32x8"
+        if num_vectors >= 2500:
+            # 32 graph neighbours per node (~256 extra bytes per vector); SQ8 trains
+            # only per-dimension ranges, so it works at any corpus size
+            return "HNSW32,SQ8"
+        # 8-bit codes are 4x smaller than float32 with negligible top-k recall loss
+        return "SQ8"
+    
+    def _configure_index(self, index: faiss.Index) -> None:
+        """Apply search-time parameters (efSearch for HNSW, nprobe for IVF indexes)"""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = self.ef_search
+            return
         
-        if org.get('program_description'):
-            parts.append(f"Programs: {org['program_description']}")
+        try:
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # Not an IVF index
+    
+    def _build_index(self, embeddings: np.ndarray) -> faiss.Index:
+        """Build an inner-product index over the (already L2-normalized) embeddings"""
+        index = faiss.index_factory(
+            self.embedding_dim,
+            self._index_description(len(embeddings)),
+            faiss.METRIC_INNER_PRODUCT
+        )
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efConstruction = self.ef_construction
+        index.train(embeddings)
+        index.add(embeddings)
+        self._configure_index(index)
+        return index
+    
+    def _encode_documents(self, documents: List[str]) -> np.ndarray:
+        """Embed documents, reusing vectors cached from earlier runs"""
+        keys = [self.embedding_cache.key(doc) for doc in documents]
+        cached = self.embedding_cache.get_many(keys)
         
-        if org.get('activities_description'):
-            parts.append(f"Activities: {org['activities_description']}")
+        missing = list({key: doc for key, doc in zip(keys, documents) if key not in cached}.items())
+        print(f"Generating embeddings ({len(cached)} cached, {len(missing)} new)...")
+        if missing:
+            new_keys = [key for key, _ in missing]
+            # encode() length-sorts its inputs before batching, so padding stays per-bucket;
+            # with convert_to_numpy it already returns a contiguous float32 array
+            new_embeddings = self.model.encode(
+                [doc for _, doc in missing],
+                batch_size=self.encode_batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=True
+            )
+            self.embedding_cache.put_many(new_keys, new_embeddings)
+            cached.update(zip(new_keys, new_embeddings))
         
-        # Category
-        if org.get('ntee_description'):
-            parts.append(f"Category: {org['ntee_description']}")
+        return np.stack([cached[key] for key in keys])
+    
+    def _create_document_text(self, org: Dict[str, Any]) -> str:
+        """Create searchable text from nonprofit data"""
+        parts = [f"{label}: {value}" for label, key in DOCUMENT_FIELDS if (value := org.get(key))]
         
         # Location
-        if org.get('city') and org.get('state'):
-            parts.append(f"Location: {org['city']}, {org['state']}")
+        city, state = org.get('city'), org.get('state')
+        if city and state:
+            parts.append(f"Location: {city}, {state}")
         
         return " ".join(parts)
     
-    def semantic_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _content_hash(documents: List[str]) -> str:
+        """Fingerprint of the document texts, in order"""
+        digest = xxhash.xxh3_128()
+        for doc in documents:
+            digest.update(doc.encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Get the L2-normalized embedding for a query (read-only; cached per normalized query)"""
+        return np.frombuffer(self._encode_query(query.strip().lower()), dtype=np.float32)
+    
+    def _encode_query_uncached(self, query: str) -> bytes:
+        """Run the model on one query; wrapped in an LRU cache in __init__"""
+        query_embedding = self.model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+        return query_embedding[0].tobytes()
+    
+    def semantic_search(self, query: str, k: int = 5, rerank: bool = True) -> List[Dict[str, Any]]:
         """
         Perform semantic search for nonprofits
         
         Args:
             query: Search query
             k: Number of results to return
+            rerank: With the static model, rerank its candidates using the full model
             
         Returns:
             List of relevant nonprofit documents with scores
@@ -127,24 +306,27 @@ class EmbeddingService:
             return []
         
         try:
-            # Generate query embedding
-            query_embedding = self.model.encode([query])
-            query_embedding = np.array(query_embedding).astype('float32')
-            
-            # Normalize for cosine similarity
-            faiss.normalize_L2(query_embedding)
-            
-            # Search
-            scores, indices = self.index.search(query_embedding, k)
+            if k >= len(self.documents) and self.doc_embeddings is not None:
+                # Every document is returned anyway: rank them exactly and skip the FAISS search
+                scores = self.doc_embeddings.astype(np.float32) @ self.embed_query(query)
+                indices = np.argsort(-scores)
+                scores = scores[indices]
+            elif self.static_model is not None and self.static_embeddings is not None:
+                scores, indices = self._static_search(query, k, rerank)
+            else:
+                # Generate normalized query embedding (hot queries skip the model)
+                query_embedding = self.embed_query(query).reshape(1, -1)
+                
+                # Search
+                scores, indices = self.index.search(query_embedding, k)
+                scores, indices = scores[0], indices[0]
             
             # Prepare results
             results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx < len(self.documents):
-                    result = self.documents[idx].copy()
-                    result['_score'] = float(score)
-                    result['_rank'] = i + 1
-                    results.append(result)
+            for i, (score, idx) in enumerate(zip(scores.tolist(), indices.tolist())):
+                if 0 <= idx < len(self.documents):  # IVF returns -1 for unfilled slots
+                    # One dict build per hit instead of copy() plus two inserts
+                    results.append({**self.documents[idx], '_score': score, '_rank': i + 1})
             
             return results
             
@@ -152,16 +334,46 @@ class EmbeddingService:
             print(f"Error in semantic search: {e}")
             return []
     
+    def _static_search(self, query: str, k: int, rerank: bool) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, indices) from static-model candidates, optionally reranked by the full model"""
+        query_embedding = self.static_model.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
+        scores = self.static_embeddings @ query_embedding
+        
+        num_candidates = min(max(k, self.rerank_candidates) if rerank else k, len(scores))
+        candidates = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+        
+        if rerank and self.doc_embeddings is not None:
+            # Stored document vectors are reused; only the query goes through the full model
+            scores = self.doc_embeddings[candidates].astype(np.float32) @ self.embed_query(query)
+        else:
+            scores = scores[candidates]
+        
+        order = np.argsort(-scores)[:k]
+        return scores[order], candidates[order]
+    
     def save_index(self) -> None:
         """Save FAISS index and documents to disk"""
         try:
+            # Every file is written to its own temporary file and renamed into place
             if self.index is not None:
-                faiss.write_index(self.index, str(self.index_path))
+                with atomic_write(self.index_path) as f:
+                    faiss.write_index(self.index, f.name)
+            
+            if self.doc_embeddings is not None:
+                with atomic_write(self.doc_embeddings_path) as f:
+                    np.save(f, self.doc_embeddings)
             
-            with open(self.documents_path, 'wb') as f:
-                pickle.dump(self.documents, f)
+            if self._neighbors is not None:
+                self._save_neighbors()
             
-            with open(self.metadata_path, 'w') as f:
+            if self.static_embeddings is not None:
+                with atomic_write(self.static_embeddings_path) as f:
+                    np.save(f, self.static_embeddings)
+            
+            with atomic_write(self.documents_path) as raw, zstd.ZstdCompressor(level=3).stream_writer(raw) as f:
+                pickle.dump(self.documents, f, protocol=pickle.HIGHEST_PROTOCOL)
+            
+            with atomic_write(self.metadata_path, 'w') as f:
                 json.dump(self.metadata, f, indent=2)
                 
             print("✅ Index saved successfully")
@@ -177,15 +389,32 @@ class EmbeddingService:
             
             # Load index
             self.index = faiss.read_index(str(self.index_path))
+            self._configure_index(self.index)
+            
+            # Map document vectors without reading them into memory
+            if self.doc_embeddings_path.exists():
+                self.doc_embeddings = np.load(self.doc_embeddings_path, mmap_mode='r')
+            
+            if self.static_model is not None and self.static_embeddings_path.exists():
+                self.static_embeddings = np.load(self.static_embeddings_path)
             
             # Load documents
-            with open(self.documents_path, 'rb') as f:
+            with open(self.documents_path, 'rb') as raw, zstd.ZstdDecompressor().stream_reader(raw) as f:
                 self.documents = pickle.load(f)
+            self._on_documents_changed()
             
             # Load metadata
             with open(self.metadata_path, 'r') as f:
                 self.metadata = json.load(f)
             
+            # Neighbour lists are memory-mapped too; data directories written before they
+            # were stored get them computed and saved once here
+            self._neighbors = self._load_neighbors()
+            if self._neighbors is None and self.doc_embeddings is not None:
+                self._neighbors = self._compute_neighbors(self.doc_embeddings)
+                if self._neighbors is not None:
+                    self._save_neighbors()
+            
             print(f"✅ Loaded index with {len(self.documents)} documents")
             return True
             
@@ -199,22 +428,75 @@ class EmbeddingService:
             return []
         
         # Find the organization
-        target_org = None
-        for org in self.documents:
-            if org.get('name', '').lower() == org_name.lower():
-                target_org = org
+        name = org_name.lower()
+        target_idx = self._name_index.get(name)
+        if target_idx is None:
+            return []
+        
+        neighbors = self._neighbors
+        if neighbors is None or k > self.num_neighbors:
+            # No stored vectors (or too many results asked for): search with its description
+            target_org = self.documents[target_idx]
+            query = f"{target_org.get('mission_description', '')} {target_org.get('program_description', '')}"
+            results = self.semantic_search(query, k + 1)  # +1 to exclude self
+            similar = [r for r in results if r.get('name', '').lower() != name]
+            return similar[:k]
+        
+        indices, scores = neighbors
+        similar = []
+        for idx, score in zip(indices[target_idx], scores[target_idx]):
+            if self.documents[idx].get('name', '').lower() == name:
+                continue
+            similar.append({**self.documents[idx], '_score': float(score), '_rank': len(similar) + 1})
+            if len(similar) == k:
                 break
+        return similar
+    
+    def _on_documents_changed(self) -> None:
+        """Rebuild the name lookup for the current documents"""
+        self._name_index = {}
+        for i, org in enumerate(self.documents):
+            self._name_index.setdefault(org.get('name', '').lower(), i)
+    
+    def _save_neighbors(self) -> None:
+        """Write the neighbour lists"""
+        for path, array in zip((self.neighbor_indices_path, self.neighbor_scores_path), self._neighbors):
+            with atomic_write(path) as f:
+                np.save(f, array)
+    
+    def _load_neighbors(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Stored neighbour lists, or None if missing or computed for other documents or settings"""
+        if not (self.neighbor_indices_path.exists() and self.neighbor_scores_path.exists()):
+            return None
         
-        if not target_org:
-            return []
+        indices = np.load(self.neighbor_indices_path, mmap_mode='r')
+        scores = np.load(self.neighbor_scores_path, mmap_mode='r')
+        expected = (len(self.documents), min(self.num_neighbors + 1, len(self.documents)))
+        if indices.shape != expected or scores.shape != expected:
+            return None
+        return indices, scores
+    
+    def _compute_neighbors(self, embeddings: np.ndarray, block_size: int = 1024) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(indices, scores) of each document's nearest documents, best first"""
+        if len(embeddings) != len(self.documents) or len(embeddings) == 0:
+            return None
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        n = len(embeddings)
+        k = min(self.num_neighbors + 1, n)  # +1 since each document is its own nearest
+        indices = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
         
-        # Use its description for similarity search
-        query = f"{target_org.get('mission_description', '')} {target_org.get('program_description', '')}"
-        results = self.semantic_search(query, k + 1)  # +1 to exclude self
+        # Row blocks keep the similarity matrix at block_size x N instead of N x N
+        for start in range(0, n, block_size):
+            sims = embeddings[start:start + block_size] @ embeddings.T
+            rows = np.arange(len(sims))[:, None]
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            order = np.argsort(-sims[rows, top], axis=1)
+            indices[start:start + block_size] = top[rows, order]
+            scores[start:start + block_size] = sims[rows, indices[start:start + block_size]]
         
-        # Filter out the original organization
-        similar = [r for r in results if r.get('name', '').lower() != org_name.lower()]
-        return similar[:k]
+        return indices, scores
     
     def get_organizations_by_category(self, category_keywords: str, k: int = 10) -> List[Dict[str, Any]]:
         """Get organizations by category or cause area"""
@@ -238,7 +520,9 @@ class EmbeddingService:
         should_rebuild = (
             self.index is None or 
             len(self.documents) == 0 or 
-            len(nonprofits) != len(self.documents)
+            len(nonprofits) != len(self.documents) or
+            # Same count but edited records; unchanged documents come from the embedding cache
+            self.metadata.get("content_hash") != self._content_hash([self._create_document_text(org) for org in nonprofits])
         )
         
         if should_rebuild:
@@ -3,13 +3,21 @@ Groq API integration for Houston Nonprofit RAG System
 Provides LLM capabilities using Groq's fast inference
 """
 import asyncio
+from collections import Counter
 from typing import List, Dict, Any, Optional
+import numpy as np
 from groq import Groq
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Upper bound on in-flight Groq requests; also sizes the app's default thread pool
+MAX_CONCURRENT_REQUESTS = int(os.getenv("GROQ_MAX_CONCURRENCY", "16"))
+
+# Returned in place of an answer when the Groq call fails
+RAG_ERROR_RESPONSE = "I apologize, but I encountered an error while processing your question about Houston nonprofits. Please try rephrasing your question."
+
 class GroqService:
     """Service for interacting with Groq API"""
     
@@ -19,6 +27,14 @@ class GroqService:
             raise ValueError("GROQ_API_KEY environment variable is required")
         self.client = Groq(api_key=self.api_key)
         self.model = "llama-3.3-70b-versatile"  # Current production model
+        self._semaphore = None  # Created inside the running event loop on first use
+        
+    async def _run_blocking(self, func, *args):
+        """Run a blocking Groq client call in a worker thread, bounded by the semaphore"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        async with self._semaphore:
+            return await asyncio.to_thread(func, *args)
         
     async def generate_rag_response(
         self, 
@@ -35,41 +51,49 @@ class GroqService:
             max_tokens: Maximum response length
             
         Returns:
-            str: Generated response
+            str: Generated response, or RAG_ERROR_RESPONSE if the Groq call failed
         """
         try:
-            # Format context from retrieved documents
-            context_text = self._format_context(context_docs)
+            return await self.generate_rag_answer(query, context_docs, max_tokens)
             
-            # Create RAG prompt
-            system_prompt = """You are a helpful assistant specializing in Houston nonprofit organizations. 
+        except Exception as e:
+            print(f"Error generating RAG response: {e}")
+            return RAG_ERROR_RESPONSE
+    
+    async def generate_rag_answer(
+        self, 
+        query: str, 
+        context_docs: List[Dict[str, Any]],
+        max_tokens: int = 1000
+    ) -> str:
+        """generate_rag_response that raises on Groq errors instead of returning an apology"""
+        # Format context from retrieved documents
+        context_text = self._format_context(context_docs)
+        
+        # Create RAG prompt
+        system_prompt = """You are a helpful assistant specializing in Houston nonprofit organizations. 
             You have access to detailed information about nonprofits including their missions, programs, 
             financial data, and activities. Provide accurate, helpful responses based on the provided context.
             
             When discussing financial information, format numbers clearly (e.g., $1.2M for millions).
             Focus on being informative and actionable for users interested in Houston nonprofits."""
-            
-            user_prompt = f"""Based on the following information about Houston nonprofits, please answer this question: {query}
+        
+        user_prompt = f"""Based on the following information about Houston nonprofits, please answer this question: {query}
 
 Context:
 {context_text}
 
 Please provide a comprehensive answer based on the nonprofit data provided. If the context doesn't contain enough information to fully answer the question, mention what additional information might be helpful."""
 
-            # Make async call to Groq
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self._sync_chat_completion,
-                system_prompt,
-                user_prompt,
-                max_tokens
-            )
-            
-            return response
-            
-        except Exception as e:
-            print(f"Error generating RAG response: {e}")
-            return f"I apologize, but I encountered an error while processing your question about Houston nonprofits. Please try rephrasing your question."
+        # Make async call to Groq
+        response = await self._run_blocking(
+            self._sync_chat_completion,
+            system_prompt,
+            user_prompt,
+            max_tokens
+        )
+        
+        return response
     
     def _sync_chat_completion(self, system_prompt: str, user_prompt: str, max_tokens: int) -> str:
         """Synchronous chat completion for use with executor"""
@@ -118,14 +142,9 @@ Organization {i}: {doc.get('name', 'Unknown')}
         try:
             # Create summary data
             total_orgs = len(nonprofits)
-            total_revenue = sum(org.get('total_revenue', 0) for org in nonprofits)
-            categories = {}
-            
-            for org in nonprofits:
-                category = org.get('ntee_description', 'Unknown')
-                categories[category] = categories.get(category, 0) + 1
-            
-            top_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)[:5]
+            revenues = np.fromiter((org.get('total_revenue') or 0 for org in nonprofits), dtype=np.float64, count=total_orgs)
+            total_revenue = float(revenues.sum())
+            top_categories = Counter(org.get('ntee_description', 'Unknown') for org in nonprofits).most_common(5)
             
             prompt = f"""Please create a brief summary of Houston's nonprofit landscape based on this data:
 
@@ -135,11 +154,7 @@ Top Categories: {', '.join([f"{cat} ({count})" for cat, count in top_categories]
 
 Provide 2-3 sentences highlighting the diversity and impact of Houston's nonprofit sector."""
 
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self._sync_simple_completion,
-                prompt
-            )
+            response = await self._run_blocking(self._sync_simple_completion, prompt)
             
             return response
             
@@ -164,11 +179,7 @@ Provide 2-3 sentences highlighting the diversity and impact of Houston's nonprof
     async def health_check(self) -> bool:
         """Check if Groq service is working"""
         try:
-            response = await asyncio.get_event_loop().run_in_executor(
-                None,
-                self._sync_simple_completion,
-                "Say 'healthy' if you can respond."
-            )
+            response = await self._run_blocking(self._sync_simple_completion, "Say 'healthy' if you can respond.")
             return "healthy" in response.lower()
             
         except Exception:
@@ -0,0 +1,47 @@
+"""
+Query cache for Houston Nonprofit RAG System
+Serves repeated questions (ignoring case and spacing) without re-running retrieval or the LLM
+"""
+import threading
+from typing import Any, Hashable, Optional, Tuple
+from cachetools import TTLCache
+
+class QueryCache:
+    """LRU + TTL cache keyed by normalized query text
+
+    Matching is on text only: the TF-IDF query vectors drop stop words and unknown
+    words, so similarity between them can't tell distinct questions apart.
+    """
+
+    def __init__(self, ttl: float = 3600, maxsize: int = 1000):
+        """
+        Initialize query cache
+
+        Args:
+            ttl: Seconds an entry stays valid
+            maxsize: Maximum number of cached queries before LRU eviction
+        """
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, text: str, namespace: Hashable = None) -> Optional[Any]:
+        """Return the cached value for the same query text, or None on a miss"""
+        with self._lock:
+            return self._entries.get(self._key(text, namespace))
+
+    def put(self, text: str, value: Any, namespace: Hashable = None) -> None:
+        """Cache a value under a query text"""
+        with self._lock:
+            self._entries[self._key(text, namespace)] = value
+
+    def clear(self) -> None:
+        """Drop all cached entries, e.g. after the index is rebuilt"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(text: str, namespace: Hashable) -> Tuple[Hashable, str]:
+        return namespace, " ".join(text.lower().split())
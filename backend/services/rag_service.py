@@ -2,11 +2,18 @@
 RAG (Retrieval-Augmented Generation) service for Houston Nonprofit System
 Combines semantic search with LLM generation
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from .simple_embedding_service import SimpleEmbeddingService
-from .groq_service import GroqService
+from .groq_service import GroqService, RAG_ERROR_RESPONSE
 from .data_service import NonprofitService
+from .query_cache import QueryCache
 import asyncio
+import heapq
+import re
+import numpy as np
+
+# Queries about the "largest"/"biggest" organizations are answered by revenue ranking
+SIZE_QUERY_PATTERN = re.compile(r"\b(?:largest|biggest|major|top|leading|impact)\b", re.IGNORECASE)
 
 class RAGService:
     """Main RAG service combining retrieval and generation"""
@@ -16,6 +23,13 @@ class RAGService:
         self.groq_service = GroqService()
         self.nonprofit_service = None  # Will be set when we have DB session
         
+        # Repeated queries are answered from cache instead of re-running retrieval/LLM
+        self.chat_cache = QueryCache(ttl=3600)
+        self.search_cache = QueryCache(ttl=3600)
+        
+        # Highest-revenue documents for size queries; fixed until the index is rebuilt
+        self._top_by_revenue = None
+        
     async def initialize_with_data(self, db_session=None):
         """Initialize RAG service with nonprofit data"""
         try:
@@ -34,6 +48,9 @@ class RAGService:
                 
                 # Rebuild index if needed
                 self.embedding_service.rebuild_index_if_needed(nonprofits)
+                self._top_by_revenue = None
+                self.chat_cache.clear()
+                self.search_cache.clear()
                 print(f"✅ RAG service initialized with {len(nonprofits)} nonprofits")
                 
             else:
@@ -53,27 +70,48 @@ class RAGService:
         Returns:
             Dict with response, sources, and metadata
         """
+        # Size queries are answered from a different ranking, so they never share entries
+        # with plain queries
+        is_size_query = SIZE_QUERY_PATTERN.search(query) is not None
+        
+        cached = self.chat_cache.get(query, namespace=is_size_query)
+        if cached is not None:
+            return {**cached, "conversation_id": conversation_id, "query": query}
+        
+        result, answered = await self._answer(query, conversation_id)
+        if answered:
+            self.chat_cache.put(query, result, namespace=is_size_query)
+        return result
+    
+    def _largest_by_revenue(self, n: int = 50) -> List[Dict[str, Any]]:
+        """Top documents by total revenue (primary impact indicator), computed once per index"""
+        if self._top_by_revenue is None:
+            all_docs = getattr(self.embedding_service, 'documents', None) or []
+            if not all_docs:
+                return []
+            self._top_by_revenue = heapq.nlargest(n, all_docs, key=lambda doc: doc.get("total_revenue") or 0)
+        return self._top_by_revenue
+    
+    async def _answer(self, query: str, conversation_id: str) -> Tuple[Dict[str, Any], bool]:
+        """Retrieve relevant documents and generate a response with Groq
+        
+        Returns the result and whether it holds an LLM answer (only those are cached).
+        """
         try:
             # Check if this is a question about "largest" or "biggest" nonprofits
-            query_lower = query.lower()
-            is_size_query = any(term in query_lower for term in ["largest", "biggest", "major", "top", "leading", "impact"])
+            is_size_query = SIZE_QUERY_PATTERN.search(query) is not None
             
             if is_size_query:
-                # For size/impact queries, get ALL documents and sort by financial metrics
-                # Load all documents from the embedding service
-                all_docs = self.embedding_service.documents if hasattr(self.embedding_service, 'documents') else []
+                # For size/impact queries, use the top organizations by total revenue
+                relevant_docs = self._largest_by_revenue()[:10]
                 
-                if not all_docs:
+                if not relevant_docs:
                     # Fallback to semantic search
-                    relevant_docs = self.embedding_service.semantic_search("Houston", k=50)
-                else:
-                    # Use all available documents
-                    relevant_docs = all_docs.copy()
-                
-                if relevant_docs:
-                    # Sort by total revenue (primary impact indicator)
-                    relevant_docs.sort(key=lambda x: x.get("total_revenue", 0), reverse=True)
-                    relevant_docs = relevant_docs[:10]  # Top 10 by revenue
+                    relevant_docs = heapq.nlargest(
+                        10,
+                        self.embedding_service.semantic_search("Houston", k=50),
+                        key=lambda doc: doc.get("total_revenue") or 0
+                    )
             else:
                 # Step 1: Regular semantic search
                 relevant_docs = self.embedding_service.semantic_search(query, k=5)
@@ -85,13 +123,19 @@ class RAGService:
                     "conversation_id": conversation_id,
                     "query": query,
                     "retrieved_count": 0
-                }
+                }, False
             
             # Step 2: Generate response using Groq
-            response = await self.groq_service.generate_rag_response(
-                query=query,
-                context_docs=relevant_docs
-            )
+            try:
+                response = await self.groq_service.generate_rag_answer(
+                    query=query,
+                    context_docs=relevant_docs
+                )
+                answered = True
+            except Exception as e:
+                print(f"Error generating RAG response: {e}")
+                response = RAG_ERROR_RESPONSE
+                answered = False
             
             # Step 3: Prepare sources
             sources = []
@@ -112,7 +156,7 @@ class RAGService:
                 "conversation_id": conversation_id,
                 "query": query,
                 "retrieved_count": len(relevant_docs)
-            }
+            }, answered
             
         except Exception as e:
             print(f"Error in RAG chat: {e}")
@@ -122,7 +166,18 @@ class RAGService:
                 "conversation_id": conversation_id,
                 "query": query,
                 "retrieved_count": 0
-            }
+            }, False
+    
+    def semantic_search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Semantic search with repeated queries served from cache"""
+        cached = self.search_cache.get(query, namespace=k)
+        if cached is not None:
+            return cached
+        
+        results = self.embedding_service.semantic_search(query, k=k)
+        if results:
+            self.search_cache.put(query, results, namespace=k)
+        return results
     
     async def get_organization_details(self, org_name: str) -> Dict[str, Any]:
         """Get detailed information about a specific organization"""
@@ -168,26 +223,36 @@ class RAGService:
             if not orgs:
                 return {"error": "No relevant organizations found"}
             
-            # Calculate financial insights
-            total_revenue = sum(org.get("total_revenue", 0) for org in orgs)
-            total_expenses = sum(org.get("total_expenses", 0) for org in orgs)
-            avg_revenue = total_revenue / len(orgs) if orgs else 0
-            
-            # Generate insights with Groq
-            financial_context = f"""
-            Found {len(orgs)} relevant organizations:
-            - Total combined revenue: ${total_revenue:,}
-            - Total combined expenses: ${total_expenses:,}
-            - Average revenue: ${avg_revenue:,}
-            
-            Top organizations by revenue:
-            {chr(10).join([f"- {org.get('name', 'Unknown')}: ${org.get('total_revenue', 0):,}" for org in orgs[:5]])}
-            """
-            
-            insight = await self.groq_service.generate_rag_response(
+            # Start the Groq call first and compute the statistics while it is in flight
+            insight_task = asyncio.create_task(self.groq_service.generate_rag_response(
                 query=f"Provide financial insights for: {query}",
                 context_docs=orgs[:5]
-            )
+            ))
+            
+            try:
+                # Calculate financial insights
+                financials = np.array(
+                    [(org.get("total_revenue") or 0, org.get("total_expenses") or 0) for org in orgs],
+                    dtype=np.float64
+                )
+                total_revenue, total_expenses = (float(total) for total in financials.sum(axis=0))
+                avg_revenue = total_revenue / len(orgs)
+                
+                # Generate insights with Groq
+                financial_context = f"""
+                Found {len(orgs)} relevant organizations:
+                - Total combined revenue: ${total_revenue:,}
+                - Total combined expenses: ${total_expenses:,}
+                - Average revenue: ${avg_revenue:,}
+                
+                Top organizations by revenue:
+                {chr(10).join([f"- {org.get('name', 'Unknown')}: ${org.get('total_revenue', 0):,}" for org in orgs[:5]])}
+                """
+                
+                insight = await insight_task
+            finally:
+                # No-op once the call has finished; stops it if the statistics failed
+                insight_task.cancel()
             
             return {
                 "insight": insight,
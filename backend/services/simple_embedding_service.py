@@ -7,18 +7,28 @@ import json
 import pickle
 import numpy as np
 from typing import List, Dict, Any, Tuple, Optional
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from pathlib import Path
-import re
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+import faiss
+from .tfidf import TfidfModel
+from .atomic_file import atomic_write
+
+# (label, field) pairs making up a document's searchable text, in order
+DOCUMENT_FIELDS = (
+    ("Organization", "name"),
+    ("Mission", "mission_description"),
+    ("Programs", "program_description"),
+    ("Activities", "activities_description"),
+    ("Category", "ntee_description"),
+)
 
 class SimpleEmbeddingService:
     """Simple embedding service using TF-IDF vectorization"""
     
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(
+        self.vectorizer = TfidfModel(
             max_features=5000,
-            stop_words='english',
             ngram_range=(1, 2),
             min_df=1,
             max_df=0.95
@@ -27,13 +37,35 @@ class SimpleEmbeddingService:
         # Paths for storing embeddings and index
         self.data_dir = Path("data/embeddings")
         self.data_dir.mkdir(parents=True, exist_ok=True)
-        self.vectorizer_path = self.data_dir / "tfidf_vectorizer.pkl"
-        self.embeddings_path = self.data_dir / "embeddings.npy"
+        self.vectorizer_path = self.data_dir / "tfidf_vocabulary.npz"
+        self.embeddings_dir = self.data_dir / "tfidf_rows"  # CSR arrays, one .npy each
+        self.postings_dir = self.data_dir / "tfidf_postings"  # CSC arrays, one .npy each
         self.documents_path = self.data_dir / "documents.pkl"
         self.metadata_path = self.data_dir / "metadata.json"
+        self.ann_index_path = self.data_dir / "tfidf_ann.index"
+        self.lsi_path = self.data_dir / "tfidf_lsi.npy"
+        self.dense_path = self.data_dir / "tfidf_dense.npy"  # Column-major, small corpora only
+        
+        # Approximate index, only for corpora where an exact scan gets expensive
+        self.ann_min_documents = 10000
+        self.ann_candidates = 4096  # ANN hits reranked with exact TF-IDF similarity
+        self.ann_nprobe = 16
+        self.ann_index = None
+        self.lsi_components = 128  # ANN vectors are LSI projections of the TF-IDF rows
+        self.lsi_basis = None
         
         # Initialize storage
         self.embeddings = None
+        self.postings = None  # CSC copy of embeddings: per-term posting lists
+        self._name_index = {}  # Lowercased organization name -> index of its first document
+        self.category_results = 200  # Ranked documents precomputed per NTEE category
+        self._category_index = {}  # Lowercased NTEE description -> (indices, scores), best first
+        
+        # Small corpora are also kept as a dense column-major array: gathering the query's
+        # columns and one small BLAS mat-vec beats the fixed overhead of sparse products.
+        # Memory-mapped when loaded, like the sparse matrices
+        self.dense_max_bytes = 16 * 1024 * 1024
+        self.embeddings_dense = None
         self.documents = []
         self.metadata = {}
         
@@ -50,17 +82,24 @@ class SimpleEmbeddingService:
         print(f"Creating TF-IDF embeddings for {len(nonprofits)} nonprofits...")
         
         # Prepare documents for embedding
-        documents = []
-        for org in nonprofits:
-            doc_text = self._create_document_text(org)
-            documents.append(doc_text)
+        documents = [self._create_document_text(org) for org in nonprofits]
         
         # Generate TF-IDF embeddings
         print("Generating TF-IDF vectors...")
         self.embeddings = self.vectorizer.fit_transform(documents)
+        self.postings = self.embeddings.tocsc()
+        self.embeddings_dense = self._dense_columns(self.embeddings)
+        
+        if len(documents) >= self.ann_min_documents:
+            print("Building ANN index...")
+            self.ann_index = self._build_ann_index(self.embeddings)
+        else:
+            self.ann_index = None
+            self.lsi_basis = None
         
         # Store documents and metadata
         self.documents = nonprofits
+        self._on_documents_changed()
         self.metadata = {
             "num_documents": len(nonprofits),
             "embedding_type": "tfidf",
@@ -72,37 +111,135 @@ class SimpleEmbeddingService:
         self.save_index()
         print(f"✅ Successfully created and saved embeddings for {len(nonprofits)} nonprofits")
     
-    def _create_document_text(self, org: Dict[str, Any]) -> str:
-        """Create searchable text from nonprofit data"""
-        parts = []
+    def _build_ann_index(self, embeddings, train_size: int = 16384, batch_size: int = 4096) -> faiss.Index:
+        """IVF-PQ inner-product index over LSI projections of the TF-IDF rows
         
-        # Basic info
-        if org.get('name'):
-            parts.append(f"Organization: {org['name']}")
+        A truncated SVD of a row sample gives the LSI basis, which maps the vocabulary-sized
+        rows to dense vectors of lsi_components dims. Rows are projected in batches to bound memory.
+        """
+        num_docs = embeddings.shape[0]
+        sample = np.sort(np.random.default_rng(0).choice(num_docs, size=min(train_size, num_docs), replace=False))
+        
+        svd = TruncatedSVD(n_components=self.lsi_components, random_state=0)
+        svd.fit(embeddings[sample])
+        self.lsi_basis = svd.components_.astype(np.float32)
+        
+        # k-means wants ~39 training points per inverted list
+        nlist = int(min(4 * np.sqrt(num_docs), len(sample) // 39))
+        index = faiss.index_factory(self.lsi_components, f"IVF{nlist},PQ32", faiss.METRIC_INNER_PRODUCT)
         
-        # Mission and programs (most important for search)
-        if org.get('mission_description'):
-            parts.append(f"Mission: {org['mission_description']}")
+        index.train(self._lsi_vectors(embeddings[sample]))
+        for start in range(0, num_docs, batch_size):
+            index.add(self._lsi_vectors(embeddings[start:start + batch_size]))
+        
+        faiss.extract_index_ivf(index).nprobe = self.ann_nprobe
+        return index
+    
+    def _lsi_vectors(self, rows) -> np.ndarray:
+        """L2-normalized LSI projections of sparse TF-IDF rows"""
+        vectors = np.ascontiguousarray(rows @ self.lsi_basis.T, dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    def _ann_candidates(self, query_vector, k: int) -> np.ndarray:
+        """Document indices of the approximate nearest neighbours of a query"""
+        _, indices = self.ann_index.search(self._lsi_vectors(query_vector), max(k, self.ann_candidates))
+        return indices[0][indices[0] >= 0]  # -1 marks unfilled slots
+    
+    def _build_results(self, indices: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Copies of the ranked documents with their scores"""
+        results = []
+        for i, (idx, score) in enumerate(zip(indices, scores)):
+            # Lower threshold to include more results (even very small similarities)
+            if score >= 0:  # Include all non-negative similarities
+                results.append({**self.documents[idx], '_score': float(score), '_rank': i + 1})
+        return results
+    
+    def _search_vector(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and cosine similarities of the k documents closest to a TF-IDF row, best first"""
+        # Rows and query are already L2-normalized, so dot products give the cosine directly
+        if self.embeddings_dense is not None:
+            similarities = self.embeddings_dense[:, query_vector.indices] @ query_vector.data
+            top = self._top_k(similarities, k)
+            return top, similarities[top]
+        if self.ann_index is not None:
+            # Large corpora: exact similarity only for the ANN candidates
+            candidates = self._ann_candidates(query_vector, k)
+            similarities = (self.embeddings[candidates] @ query_vector.T).toarray().ravel()
+            top = self._top_k(similarities, k)
+            return candidates[top], similarities[top]
+        return self._top_documents(query_vector, k)
+    
+    def _dense_columns(self, matrix) -> Optional[np.ndarray]:
+        """Column-major dense copy of a TF-IDF matrix, or None if it exceeds dense_max_bytes"""
+        if not self._fits_dense(matrix):
+            return None
+        return np.asfortranarray(matrix.toarray())
+    
+    def _fits_dense(self, matrix) -> bool:
+        return matrix.shape[0] * matrix.shape[1] * matrix.dtype.itemsize <= self.dense_max_bytes
+    
+    def _load_dense_columns(self) -> Optional[np.ndarray]:
+        """Memory-mapped dense copy of the loaded matrix; written once if the index predates it"""
+        if not self._fits_dense(self.embeddings):
+            return None
+        
+        if self.dense_path.exists():
+            dense = np.load(self.dense_path, mmap_mode='r')
+            if dense.shape == self.embeddings.shape and dense.dtype == self.embeddings.dtype:
+                return dense
+        
+        with atomic_write(self.dense_path) as f:
+            np.save(f, self._dense_columns(self.embeddings))
+        return np.load(self.dense_path, mmap_mode='r')
+    
+    def _top_documents(self, query_vector, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and scores of the k best documents, scored via the query terms' posting lists
+        
+        Only the columns of terms present in the query are read, so the cost is the summed
+        document frequency of those terms rather than the nonzeros of the whole matrix. Scores
+        stay sparse, so top-k selection only looks at documents sharing a term with the query.
+        """
+        num_terms = query_vector.nnz
+        query_weights = sparse.csr_matrix(
+            (query_vector.data, np.arange(num_terms), [0, num_terms]), shape=(1, num_terms)
+        )
+        matches = (query_weights @ self.postings[:, query_vector.indices].T).tocsr()
         
-        if org.get('program_description'):
-            parts.append(f"Programs: {org['program_description']}")
+        top = self._top_k(matches.data, k)
+        indices, scores = matches.indices[top], matches.data[top]
         
-        if org.get('activities_description'):
-            parts.append(f"Activities: {org['activities_description']}")
+        k = min(k, len(self.documents))
+        if len(indices) < k:
+            # Fewer matches than k: fill with zero-score documents, as a full scan would
+            rest = np.setdiff1d(np.arange(min(len(self.documents), k + matches.nnz)), matches.indices)[:k - len(indices)]
+            indices = np.concatenate([indices, rest])
+            scores = np.concatenate([scores, np.zeros(len(rest), dtype=scores.dtype)])
+        return indices, scores
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Positions of the k largest scores, best first: partial selection, then sort only those k"""
+        k = min(k, scores.size)
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(scores, -k)[-k:]
+        return top[np.argsort(-scores[top])]
+    
+    def _create_document_text(self, org: Dict[str, Any]) -> str:
+        """Create searchable text from nonprofit data
         
-        # Category
-        if org.get('ntee_description'):
-            parts.append(f"Category: {org['ntee_description']}")
+        Punctuation and repeated whitespace are left in place: the TF-IDF tokenizer only
+        keeps runs of word characters, so stripping them first would not change any term.
+        """
+        parts = [f"{label}: {value}" for label, key in DOCUMENT_FIELDS if (value := org.get(key))]
         
         # Location
-        if org.get('city') and org.get('state'):
-            parts.append(f"Location: {org['city']}, {org['state']}")
-        
-        text = " ".join(parts)
-        # Clean up the text
-        text = re.sub(r'[^\w\s]', ' ', text)
-        text = re.sub(r'\s+', ' ', text)
-        return text.strip()
+        city, state = org.get('city'), org.get('state')
+        if city and state:
+            parts.append(f"Location: {city}, {state}")
+        
+        return " ".join(parts)
     
     def semantic_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """
@@ -119,30 +256,11 @@ class SimpleEmbeddingService:
             return []
         
         try:
-            # Clean query
-            query = re.sub(r'[^\w\s]', ' ', query)
-            query = re.sub(r'\s+', ' ', query).strip()
-            
-            # Transform query using fitted vectorizer
-            query_vector = self.vectorizer.transform([query])
+            # Build the query row directly from the fitted vocabulary and IDF weights
+            query_vector = self.vectorizer.transform_query(query)
+            top_indices, top_scores = self._search_vector(query_vector, k)
             
-            # Calculate cosine similarity
-            similarities = cosine_similarity(query_vector, self.embeddings).flatten()
-            
-            # Get top k indices
-            top_indices = similarities.argsort()[-k:][::-1]
-            
-            # Prepare results
-            results = []
-            for i, idx in enumerate(top_indices):
-                # Lower threshold to include more results (even very small similarities)
-                if similarities[idx] >= 0:  # Include all non-negative similarities
-                    result = self.documents[idx].copy()
-                    result['_score'] = float(similarities[idx])
-                    result['_rank'] = i + 1
-                    results.append(result)
-            
-            return results
+            return self._build_results(top_indices, top_scores)
             
         except Exception as e:
             print(f"Error in semantic search: {e}")
@@ -151,20 +269,39 @@ class SimpleEmbeddingService:
     def save_index(self) -> None:
         """Save TF-IDF vectorizer and embeddings to disk"""
         try:
-            # Save vectorizer
-            with open(self.vectorizer_path, 'wb') as f:
-                pickle.dump(self.vectorizer, f)
+            # Save vocabulary and IDF weights
+            with atomic_write(self.vectorizer_path) as f:
+                self.vectorizer.save(f)
             
-            # Save embeddings
+            # Save embeddings and posting lists (TF-IDF rows are almost all zeros)
             if self.embeddings is not None:
-                np.save(self.embeddings_path, self.embeddings.toarray())
+                self._save_sparse(self.embeddings, self.embeddings_dir)
+                self._save_sparse(self.postings, self.postings_dir)
+            
+            # Save ANN index and its LSI basis (or drop ones left over from a larger corpus)
+            if self.ann_index is not None:
+                with atomic_write(self.ann_index_path) as f:
+                    faiss.write_index(self.ann_index, f.name)
+                with atomic_write(self.lsi_path) as f:
+                    np.save(f, self.lsi_basis)
+            else:
+                for path in (self.ann_index_path, self.lsi_path):
+                    if path.exists():
+                        path.unlink()
+            
+            # Save the dense copy (or drop one left over from a smaller corpus)
+            if self.embeddings_dense is not None:
+                with atomic_write(self.dense_path) as f:
+                    np.save(f, self.embeddings_dense)
+            elif self.dense_path.exists():
+                self.dense_path.unlink()
             
             # Save documents
-            with open(self.documents_path, 'wb') as f:
-                pickle.dump(self.documents, f)
+            with atomic_write(self.documents_path) as f:
+                pickle.dump(self.documents, f, protocol=pickle.HIGHEST_PROTOCOL)
             
             # Save metadata
-            with open(self.metadata_path, 'w') as f:
+            with atomic_write(self.metadata_path, 'w') as f:
                 json.dump(self.metadata, f, indent=2)
                 
             print("✅ Index saved successfully")
@@ -172,28 +309,53 @@ class SimpleEmbeddingService:
         except Exception as e:
             print(f"Error saving index: {e}")
     
+    @staticmethod
+    def _save_sparse(matrix, directory: Path) -> None:
+        """Write a CSR/CSC matrix as uncompressed .npy arrays, so it can be memory-mapped"""
+        directory.mkdir(exist_ok=True)
+        arrays = {"data": matrix.data, "indices": matrix.indices, "indptr": matrix.indptr,
+                  "shape": np.array(matrix.shape)}
+        for name, array in arrays.items():
+            with atomic_write(directory / f"{name}.npy") as f:
+                np.save(f, array)
+    
+    @staticmethod
+    def _load_sparse(directory: Path, matrix_class):
+        """Read-only, memory-mapped matrix written by _save_sparse"""
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r') for name in ("data", "indices", "indptr")}
+        shape = tuple(int(n) for n in np.load(directory / "shape.npy"))
+        return matrix_class((arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape, copy=False)
+    
     def load_index(self) -> bool:
         """Load TF-IDF vectorizer and embeddings from disk"""
         try:
-            required_files = [self.vectorizer_path, self.embeddings_path, 
+            required_files = [self.vectorizer_path, self.embeddings_dir, self.postings_dir,
                             self.documents_path, self.metadata_path]
             
             if not all(p.exists() for p in required_files):
                 return False
             
-            # Load vectorizer
-            with open(self.vectorizer_path, 'rb') as f:
-                self.vectorizer = pickle.load(f)
+            # Load vocabulary and IDF weights
+            self.vectorizer = TfidfModel.load(self.vectorizer_path)
+            
+            # Map embeddings and posting lists without reading them into memory, so
+            # server worker processes share one copy through the page cache
+            self.embeddings = self._load_sparse(self.embeddings_dir, sparse.csr_matrix)
+            self.postings = self._load_sparse(self.postings_dir, sparse.csc_matrix)
+            self.embeddings_dense = self._load_dense_columns()
             
-            # Load embeddings
-            embeddings_array = np.load(self.embeddings_path)
-            # Convert back to sparse matrix for memory efficiency
-            from scipy.sparse import csr_matrix
-            self.embeddings = csr_matrix(embeddings_array)
+            # Load ANN index if this corpus has one
+            self.ann_index = None
+            self.lsi_basis = None
+            if self.ann_index_path.exists() and self.lsi_path.exists():
+                self.ann_index = faiss.read_index(str(self.ann_index_path))
+                faiss.extract_index_ivf(self.ann_index).nprobe = self.ann_nprobe
+                self.lsi_basis = np.load(self.lsi_path)
             
             # Load documents
             with open(self.documents_path, 'rb') as f:
                 self.documents = pickle.load(f)
+            self._on_documents_changed()
             
             # Load metadata
             with open(self.metadata_path, 'r') as f:
@@ -208,38 +370,56 @@ class SimpleEmbeddingService:
     
     def get_similar_organizations(self, org_name: str, k: int = 3) -> List[Dict[str, Any]]:
         """Find organizations similar to a given organization"""
-        if not self.documents:
+        if not self.documents or self.embeddings is None:
             return []
         
         # Find the organization
-        target_org = None
-        for org in self.documents:
-            if org.get('name', '').lower() == org_name.lower():
-                target_org = org
-                break
+        name = org_name.lower()
+        target_idx = self._name_index.get(name)
+        if target_idx is None:
+            return []
         
-        if not target_org:
+        # Its stored TF-IDF row is the query
+        try:
+            indices, scores = self._search_vector(self.embeddings[target_idx], k + 1)  # +1 to exclude self
+        except Exception as e:
+            print(f"Error finding similar organizations: {e}")
             return []
         
-        # Use its description for similarity search
-        query_parts = []
-        if target_org.get('mission_description'):
-            query_parts.append(target_org['mission_description'])
-        if target_org.get('program_description'):
-            query_parts.append(target_org['program_description'])
-        if target_org.get('ntee_description'):
-            query_parts.append(target_org['ntee_description'])
-        
-        query = " ".join(query_parts)
-        results = self.semantic_search(query, k + 1)  # +1 to exclude self
-        
-        # Filter out the original organization
-        similar = [r for r in results if r.get('name', '').lower() != org_name.lower()]
-        return similar[:k]
+        similar = []
+        for idx, score in zip(indices, scores):
+            if self.documents[idx].get('name', '').lower() == name:
+                continue
+            similar.append({**self.documents[idx], '_score': float(score), '_rank': len(similar) + 1})
+            if len(similar) == k:
+                break
+        return similar
+    
+    def _on_documents_changed(self) -> None:
+        """Rebuild the name and category lookups for the current documents"""
+        self._name_index = {}
+        for i, org in enumerate(self.documents):
+            self._name_index.setdefault(org.get('name', '').lower(), i)
+        
+        # Rank documents once for each NTEE category present, with the same query
+        # get_organizations_by_category would run
+        self._category_index = {}
+        categories = {org['ntee_description'].lower() for org in self.documents if org.get('ntee_description')}
+        for category in categories:
+            query_vector = self.vectorizer.transform_query(self._category_query(category))
+            self._category_index[category] = self._search_vector(query_vector, self.category_results)
     
     def get_organizations_by_category(self, category_keywords: str, k: int = 10) -> List[Dict[str, Any]]:
         """Get organizations by category or cause area"""
-        return self.semantic_search(f"organizations working on {category_keywords}", k)
+        ranked = self._category_index.get(category_keywords.strip().lower())
+        if ranked is not None and k <= len(ranked[0]):
+            indices, scores = ranked
+            return self._build_results(indices[:k], scores[:k])
+        return self.semantic_search(self._category_query(category_keywords), k)
+    
+    @staticmethod
+    def _category_query(category_keywords: str) -> str:
+        return f"organizations working on {category_keywords}"
     
     def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector index"""
@@ -249,8 +429,8 @@ class SimpleEmbeddingService:
         return {
             "num_documents": len(self.documents),
             "embedding_type": "TF-IDF",
-            "max_features": getattr(self.vectorizer, 'max_features', 0),
-            "vocabulary_size": len(getattr(self.vectorizer, 'vocabulary_', {})),
+            "max_features": self.vectorizer.max_features,
+            "vocabulary_size": len(self.vectorizer.vocabulary_),
             "embedding_shape": self.embeddings.shape if self.embeddings is not None else None,
             "metadata": self.metadata
         }
@@ -271,11 +451,11 @@ class SimpleEmbeddingService:
     
     def get_top_terms_for_query(self, query: str, n_terms: int = 10) -> List[str]:
         """Get top TF-IDF terms for a query"""
-        if not hasattr(self.vectorizer, 'vocabulary_'):
+        if not self.vectorizer.vocabulary_:
             return []
         
         try:
-            query_vector = self.vectorizer.transform([query])
+            query_vector = self.vectorizer.transform_query(query)
             feature_names = self.vectorizer.get_feature_names_out()
             
             # Get non-zero features and their scores
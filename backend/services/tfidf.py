@@ -0,0 +1,174 @@
+"""
+TF-IDF vectorizer for Houston Nonprofit RAG System
+Set-based document frequencies and precomputed IDFs, emitting CSR matrices directly
+"""
+import re
+from collections import Counter
+from itertools import chain, repeat
+from pathlib import Path
+from typing import Dict, List, Tuple
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Same tokenization as scikit-learn's default token_pattern
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+class TfidfModel:
+    """TF-IDF with scikit-learn's TfidfVectorizer semantics (smooth idf, l2-normalized rows)
+
+    Vocabulary indices follow sorted term order and the IDF weights are kept as a plain
+    array, so fitted models are saved as arrays instead of pickled estimators.
+    """
+
+    def __init__(
+        self,
+        max_features: int = 5000,
+        ngram_range: Tuple[int, int] = (1, 2),
+        min_df: int = 1,
+        max_df: float = 0.95,
+        stop_words=ENGLISH_STOP_WORDS,
+        dtype=np.float32
+    ):
+        """
+        Initialize TF-IDF model
+
+        Args:
+            max_features: Keep only this many terms, by corpus term frequency
+            ngram_range: Smallest and largest word n-gram
+            min_df: Minimum number of documents a term must appear in
+            max_df: Maximum fraction of documents a term may appear in
+            stop_words: Words dropped before n-grams are formed
+            dtype: Dtype of the TF-IDF values; float32 halves their size versus float64
+        """
+        self.max_features = max_features
+        self.ngram_range = ngram_range
+        self.min_df = min_df
+        self.max_df = max_df
+        self.stop_words = frozenset(stop_words)
+        self.dtype = np.dtype(dtype)
+        self.vocabulary_: Dict[str, int] = {}
+        self.idf_ = np.zeros(0)
+
+    def analyze(self, text: str) -> List[str]:
+        """Lowercase, tokenize, drop stop words and add word n-grams"""
+        tokens = [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in self.stop_words]
+        min_n, max_n = self.ngram_range
+
+        terms = tokens if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            terms.extend(map(" ".join, zip(*(tokens[i:] for i in range(n)))))
+        return terms
+
+    def fit_transform(self, documents: List[str]) -> sparse.csr_matrix:
+        """Learn vocabulary and IDF weights, and return the TF-IDF matrix"""
+        doc_counts = [Counter(self.analyze(doc)) for doc in documents]
+        num_docs = len(doc_counts)
+
+        # Document frequency: iterating a Counter yields each distinct term once
+        doc_freq = Counter(chain.from_iterable(doc_counts))
+
+        max_doc_count = self.max_df if isinstance(self.max_df, int) else self.max_df * num_docs
+        terms = sorted(term for term, df in doc_freq.items() if self.min_df <= df <= max_doc_count)
+        counts = self._count_matrix(doc_counts, {term: i for i, term in enumerate(terms)})
+
+        if self.max_features is not None and len(terms) > self.max_features:
+            # Most frequent terms across the corpus; ties go to the alphabetically first term
+            term_freq = np.asarray(counts.sum(axis=0)).ravel()
+            keep = np.sort(np.argsort(-term_freq, kind="stable")[:self.max_features])
+            counts = counts[:, keep]
+            terms = [terms[i] for i in keep]
+
+        self.vocabulary_ = {term: i for i, term in enumerate(terms)}
+        doc_freq = np.array([doc_freq[term] for term in terms], dtype=np.float64)
+        self.idf_ = np.log((1 + num_docs) / (1 + doc_freq)) + 1
+
+        return self._weight(counts)
+
+    def transform(self, documents: List[str]) -> sparse.csr_matrix:
+        """TF-IDF matrix for documents using the fitted vocabulary"""
+        doc_counts = [Counter(self.analyze(doc)) for doc in documents]
+        return self._weight(self._count_matrix(doc_counts, self.vocabulary_))
+
+    def transform_query(self, text: str) -> sparse.csr_matrix:
+        """Single-row TF-IDF vector for one query, built without the batch matrix path"""
+        vocabulary = self.vocabulary_
+        indices = [vocabulary[term] for term in self.analyze(text) if term in vocabulary]
+        indices, counts = np.unique(np.array(indices, dtype=np.int32), return_counts=True)
+
+        data = counts * self.idf_[indices]
+        norm = np.sqrt(data @ data)
+        if norm > 0:
+            data /= norm
+        return sparse.csr_matrix(
+            (data.astype(self.dtype), indices, [0, len(indices)]),
+            shape=(1, len(vocabulary))
+        )
+
+    def get_feature_names_out(self) -> np.ndarray:
+        return np.array(sorted(self.vocabulary_, key=self.vocabulary_.get), dtype=object)
+
+    @staticmethod
+    def _count_matrix(doc_counts: List[Counter], vocabulary: Dict[str, int]) -> sparse.csr_matrix:
+        """Raw term counts as CSR; terms outside the vocabulary are dropped"""
+        lengths = np.fromiter(map(len, doc_counts), dtype=np.int64, count=len(doc_counts))
+        total = int(lengths.sum())
+
+        # Keys and values of each Counter iterate in the same order
+        columns = np.fromiter(
+            chain.from_iterable(map(vocabulary.get, counts, repeat(-1)) for counts in doc_counts),
+            dtype=np.int64,
+            count=total
+        )
+        values = np.fromiter(
+            chain.from_iterable(counts.values() for counts in doc_counts),
+            dtype=np.float64,
+            count=total
+        )
+        rows = np.repeat(np.arange(len(doc_counts)), lengths)
+
+        known = columns >= 0
+        matrix = sparse.csr_matrix(
+            (values[known], (rows[known], columns[known])),
+            shape=(len(doc_counts), len(vocabulary))
+        )
+        matrix.sort_indices()
+        return matrix
+
+    def _weight(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Apply IDF weights and l2-normalize each row (rows without known terms stay empty)"""
+        matrix = counts.astype(self.dtype)
+        matrix.data *= self.idf_[matrix.indices]
+
+        row_norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        row_norms[row_norms == 0] = 1.0
+        matrix.data /= np.repeat(row_norms, np.diff(matrix.indptr))
+        return matrix
+
+    def save(self, file) -> None:
+        """Save the fitted vocabulary, IDF weights and settings to a path or binary file"""
+        np.savez(
+            file,
+            terms=self.get_feature_names_out().astype(str),
+            idf=self.idf_,
+            max_features=self.max_features or 0,
+            ngram_range=np.array(self.ngram_range),
+            min_df=self.min_df,
+            max_df=self.max_df,
+            dtype=self.dtype.name
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "TfidfModel":
+        """Load a model written by save()"""
+        with np.load(path) as saved:
+            model = cls(
+                max_features=int(saved["max_features"]) or None,
+                ngram_range=tuple(int(n) for n in saved["ngram_range"]),
+                min_df=int(saved["min_df"]),
+                max_df=saved["max_df"].item(),
+                dtype=str(saved["dtype"])
+            )
+            model.vocabulary_ = {str(term): i for i, term in enumerate(saved["terms"])}
+            model.idf_ = saved["idf"]
+        return model
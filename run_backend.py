@@ -3,6 +3,7 @@
 Run the Houston Nonprofit RAG backend API
 """
 
+import os
 import sys
 from pathlib import Path
 
@@ -10,7 +11,20 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent))
 
 import uvicorn
-from backend.app.main import app
+
+# DEV=1 runs a single auto-reloading process; otherwise serve with WORKERS processes
+RELOAD = os.getenv("DEV", "0") == "1"
+WORKERS = int(os.getenv("WORKERS", os.cpu_count() or 1))
 
 if __name__ == "__main__":
-    uvicorn.run("backend.app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # The app is passed as an import string so each worker process imports it itself;
+    # "auto" picks uvloop and httptools when installed (uvicorn[standard])
+    uvicorn.run(
+        "backend.app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=RELOAD,
+        workers=1 if RELOAD else WORKERS,
+        loop="auto",
+        http="auto"
+    )
\ No newline at end of file
@@ -3,11 +3,13 @@
 Create sample Houston nonprofit data for demonstration
 """
 
-import json
-import random
+import numpy as np
+import orjson
 from datetime import datetime, date
 from pathlib import Path
 
+rng = np.random.default_rng()
+
 # NTEE codes and descriptions
 NTEE_CODES = {
     'A20': 'Arts, Culture & Humanities - Visual Arts',
@@ -162,7 +164,7 @@ SAMPLE_ORGS = [
     }
 ]
 
-def generate_houston_address():
+def generate_houston_addresses(count):
     """Generate realistic Houston addresses"""
     streets = [
         'Main St', 'Richmond Ave', 'Westheimer Rd', 'Kirby Dr', 'Memorial Dr',
@@ -170,12 +172,20 @@ def generate_houston_address():
         'Buffalo Speedway', 'Post Oak Blvd', 'Bellaire Blvd', 'Bissonnet St'
     ]
     
-    return {
-        'street_address': f"{random.randint(100, 9999)} {random.choice(streets)}",
-        'city': 'Houston',
-        'state': 'TX',
-        'zip_code': f"770{random.randint(10, 99)}"
-    }
+    # Sample every column in one call each
+    street_nums = rng.integers(100, 10000, size=count).tolist()
+    street_idx = rng.integers(len(streets), size=count).tolist()
+    zip_tails = rng.integers(10, 100, size=count).tolist()
+    
+    return [
+        {
+            'street_address': f"{number} {streets[street]}",
+            'city': 'Houston',
+            'state': 'TX',
+            'zip_code': f"770{tail}"
+        }
+        for number, street, tail in zip(street_nums, street_idx, zip_tails)
+    ]
 
 def generate_additional_orgs(count=50):
     """Generate additional random organizations"""
@@ -192,25 +202,24 @@ def generate_additional_orgs(count=50):
         ('Housing Assistance Organization', 'P20', 'To provide housing support and services to those in need.')
     ]
     
+    # Generate realistic financial data, one vectorized draw per column
+    types_idx = rng.integers(len(org_types), size=count).tolist()
+    revenues = rng.integers(500000, 15000001, size=count)
+    expenses = (revenues * rng.uniform(0.85, 0.95, size=count)).astype(np.int64).tolist()
+    assets = (revenues * rng.uniform(0.5, 2.5, size=count)).astype(np.int64).tolist()
+    
     additional_orgs = []
-    for i in range(count):
-        org_type, ntee, mission = random.choice(org_types)
-        name = f"Houston {org_type} #{i+1}"
-        
-        # Generate realistic financial data
-        revenue = random.randint(500000, 15000000)
-        expenses = int(revenue * random.uniform(0.85, 0.95))
-        assets = int(revenue * random.uniform(0.5, 2.5))
-        
+    for i, (type_idx, revenue, expense, asset) in enumerate(zip(types_idx, revenues.tolist(), expenses, assets)):
+        org_type, ntee, mission = org_types[type_idx]
         org = {
-            'name': name,
+            'name': f"Houston {org_type} #{i+1}",
             'ntee': ntee,
             'mission': mission,
             'programs': f'{org_type} programs and services for the Houston community.',
             'activities': f'Community outreach, direct services, partnerships with local organizations.',
             'revenue': revenue,
-            'expenses': expenses,
-            'assets': assets
+            'expenses': expense,
+            'assets': asset
         }
         additional_orgs.append(org)
     
@@ -222,14 +231,15 @@ def create_sample_data():
     # Combine sample orgs with generated ones
     all_orgs = SAMPLE_ORGS + generate_additional_orgs(50)
     
+    # Generate EINs, addresses and filing IDs for all organizations at once
+    ein_numbers = rng.integers(1000000, 10000000, size=len(all_orgs)).tolist()
+    addresses = generate_houston_addresses(len(all_orgs))
+    object_numbers = rng.integers(100000000, 1000000000, size=len(all_orgs)).tolist()
+    
     nonprofits_data = []
     
-    for i, org in enumerate(all_orgs):
-        # Generate EIN
-        ein = f"74{random.randint(1000000, 9999999)}"
-        
-        # Generate address
-        address = generate_houston_address()
+    for org, ein_number, address, object_number in zip(all_orgs, ein_numbers, addresses, object_numbers):
+        ein = f"74{ein_number}"
         
         # Create nonprofit record
         nonprofit = {
@@ -250,7 +260,7 @@ def create_sample_data():
             'tax_year': 2023,
             'filing_type': '990',
             'website': f"https://www.{org['name'].lower().replace(' ', '').replace('&', 'and')}.org",
-            'object_id': f"202340{random.randint(100000000, 999999999)}"
+            'object_id': f"202340{object_number}"
         }
         
         nonprofits_data.append(nonprofit)
@@ -260,8 +270,8 @@ def create_sample_data():
     output_dir.mkdir(parents=True, exist_ok=True)
     
     output_file = output_dir / "houston_nonprofits_sample.json"
-    with open(output_file, 'w') as f:
-        json.dump(nonprofits_data, f, indent=2)
+    with open(output_file, 'wb') as f:
+        f.write(orjson.dumps(nonprofits_data, option=orjson.OPT_INDENT_2))
     
     print(f"Created sample data with {len(nonprofits_data)} Houston nonprofits")
     print(f"Saved to: {output_file}")
@@ -286,8 +296,8 @@ def create_sample_data():
     }
     
     summary_file = output_dir / "houston_nonprofits_summary.json"
-    with open(summary_file, 'w') as f:
-        json.dump(summary, f, indent=2)
+    with open(summary_file, 'wb') as f:
+        f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
     
     print(f"Summary statistics saved to: {summary_file}")
     